@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Before/after timings for the Vector kernels.
+
+The ``legacy_*`` functions are the interpreter-speed loops that
+``linea.vector`` used before its kernels were rewritten as whole-array
+numpy operations; they are kept here only so the speedup can be measured.
+
+Run with ``python benchmarks/kernels.py`` (or ``make bench``).
+"""
+import math
+import os
+import sys
+import timeit
+
+import numpy
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from linea import vector  # pylint: disable=C0413
+
+SIZES = (1000, 10000, 100000)
+
+
+def legacy_magnitude(v):
+    return math.sqrt(sum(map(lambda x: x * x, v.v)))
+
+
+def legacy_dot(v, w):
+    return sum([a * b for (a, b) in zip(v.v, w.v)])
+
+
+def legacy_mul(v, k):
+    return vector.Vector(a=list(map(lambda x: x * k, v.v)))
+
+
+def legacy_str(v):
+    s = '['
+    for i in range(len(v.v)):
+        s += str(v.v[i])
+        if i < len(v.v) - 1:
+            s += '; '
+    s += ']'
+    return s
+
+
+def best_of(fn, repeat=5):
+    """Return the best time in seconds for a single call of fn."""
+    number = 1
+    while timeit.timeit(fn, number=number) < 0.05:
+        number *= 2
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+
+def cases(v, w):
+    """Yield (name, before, after) callables for each kernel."""
+    yield 'magnitude', lambda: legacy_magnitude(v), v.magnitude
+    yield 'dot', lambda: legacy_dot(v, w), lambda: vector.dot(v, w)
+    yield 'scalar *', lambda: legacy_mul(v, 2.5), lambda: v * 2.5
+    yield 'str', lambda: legacy_str(v), lambda: str(v)
+
+
+def main():
+    rng = numpy.random.default_rng(0)
+    print('{:>10} {:>8} {:>12} {:>12} {:>9}'.format(
+        'kernel', 'size', 'before (s)', 'after (s)', 'speedup'))
+    for size in SIZES:
+        v = vector.Vector(rng.standard_normal(size))
+        w = vector.Vector(rng.standard_normal(size))
+        for name, before, after in cases(v, w):
+            tb = best_of(before, repeat=3)
+            ta = best_of(after)
+            print('{:>10} {:>8} {:>12.3e} {:>12.3e} {:>8.1f}x'.format(
+                name, size, tb, ta, tb / ta))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Speed and accuracy of ``dot`` for each storage dtype and accumulation mode.
+
+The error is relative to the exact dot product of the stored values,
+rounded once to float64.
+
+Run with ``python benchmarks/precision.py``.
+"""
+import math
+import os
+import sys
+
+import numpy
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from linea import vector  # pylint: disable=C0413
+from kernels import best_of  # pylint: disable=C0413
+
+SIZES = (1000, 1000000)
+DTYPES = ('float32', 'float64')
+
+
+def exact_dot(a, b):
+    """The correctly rounded dot product of float arrays a and b."""
+    x = numpy.asarray(a, dtype=numpy.float64)
+    y = numpy.asarray(b, dtype=numpy.float64)
+    p = x * y
+    # Dekker's two-product: p + e is exactly x * y.
+    (xh, yh) = (134217729.0 * x, 134217729.0 * y)
+    xh -= xh - x
+    yh -= yh - y
+    e = (x - xh) * (y - yh) - (((p - xh * yh) - (x - xh) * yh) - xh * (y - yh))
+    return math.fsum(numpy.concatenate((p, e)).tolist())
+
+
+def main():
+    rng = numpy.random.default_rng(0)
+    print('{:>8} {:>8} {:>12} {:>12} {:>10}'.format(
+        'dtype', 'size', 'mode', 'time', 'rel. error'))
+    for size in SIZES:
+        a = rng.standard_normal(size)
+        b = rng.standard_normal(size)
+        for dtype in DTYPES:
+            v = vector.Vector(a, dtype=dtype)
+            w = vector.Vector(b, dtype=dtype)
+            exact = exact_dot(v.v, w.v)
+            for mode in vector.ACCUMULATION_MODES:
+                t = best_of(lambda mode=mode: vector.dot(v, w, accumulate=mode))
+                error = abs(float(vector.dot(v, w, accumulate=mode)) - exact) / abs(exact)
+                print('{:>8} {:>8} {:>12} {:>9.1f} us {:>10.1e}'.format(
+                    dtype, size, mode, t * 1e6, error))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Per-operation latency and per-object memory of Vec3 against an
+ndarray-backed Vector of the same size.
+
+Run with ``python benchmarks/small.py``.
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from linea import vector  # pylint: disable=C0413
+from kernels import best_of  # pylint: disable=C0413
+
+
+def cases(cls):
+    v = cls(1.671, -1.012, -0.318)
+    w = cls(-8.987, -9.838, 5.031)
+    yield 'construct', lambda: cls(1.671, -1.012, -0.318)
+    yield '+', lambda: v + w
+    yield 'scalar *', lambda: v * 2.5
+    yield 'magnitude', v.magnitude
+    yield 'dot', lambda: vector.dot(v, w)
+    yield 'angle', lambda: vector.angle(v, w)
+    yield 'cross', lambda: vector.cross(v, w)
+    yield 'area', lambda: vector.area_triangle(v, w)
+
+
+def object_size(cls, count=10000):
+    """Return the average number of bytes allocated per vector."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = [cls(float(i), 1.0, 2.0) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del keep
+    return (after - before) / count
+
+
+def main():
+    print('{:>10} {:>12} {:>12} {:>9}'.format(
+        'op', 'Vector (us)', 'Vec3 (us)', 'speedup'))
+    for (name, slow), (_, fast) in zip(cases(vector.Vector), cases(vector.Vec3)):
+        ts, tf = best_of(slow), best_of(fast)
+        print('{:>10} {:>12.2f} {:>12.2f} {:>8.1f}x'.format(
+            name, ts * 1e6, tf * 1e6, ts / tf))
+    ms, mf = object_size(vector.Vector), object_size(vector.Vec3)
+    print('{:>10} {:>10.0f} B {:>10.0f} B {:>8.1f}x'.format(
+        'memory', ms, mf, ms / mf))
+
+
+if __name__ == '__main__':
+    main()
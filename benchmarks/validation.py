@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Per-call cost of ``dot`` and ``angle`` under each validation mode.
+
+Run with ``python benchmarks/validation.py``.
+"""
+import os
+import sys
+
+import numpy
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from linea import vector  # pylint: disable=C0413
+from kernels import best_of  # pylint: disable=C0413
+
+SIZES = (3, 1000, 100000)
+
+
+def main():
+    rng = numpy.random.default_rng(0)
+    print('{:>6} {:>8} {:>12} {:>12} {:>12}'.format(
+        'op', 'size', *vector.VALIDATION_MODES))
+    for size in SIZES:
+        v = vector.Vector(rng.standard_normal(size))
+        w = vector.Vector(rng.standard_normal(size))
+        for name, fn in (('dot', vector.dot), ('angle', vector.angle)):
+            times = [best_of(lambda mode=mode: fn(v, w, validate=mode))
+                     for mode in vector.VALIDATION_MODES]
+            print('{:>6} {:>8} '.format(name, size) +
+                  ' '.join('{:>9.2f} us'.format(t * 1e6) for t in times))
+
+
+if __name__ == '__main__':
+    main()
@@ -9,5 +9,20 @@ Modules
 -------
 
 - :py:mod:`linea.vector`
+- :py:mod:`linea.batch`
+- :py:mod:`linea.bench`
+- :py:mod:`linea.pairwise`
+- :py:mod:`linea.index`
+- :py:mod:`linea.group`
+- :py:mod:`linea.parallel`
+- :py:mod:`linea.store`
+- :py:mod:`linea.stream`
+- :py:mod:`linea.lazy`
+- :py:mod:`linea.engine`
+- :py:mod:`linea.instrument`
+- :py:mod:`linea.mesh`
+- :py:mod:`linea.accumulate`
+- :py:mod:`linea.wire`
+- :py:mod:`linea.memo`
 - :py:mod:`linea.util`
 """
\ No newline at end of file
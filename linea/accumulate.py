@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+``linea.accumulate``
+
+Running sums, means and per-component variances of streams of vectors.
+
+An :py:class:`Accumulator` holds a fixed number of arrays of the vectors'
+dimension whatever the length of the stream, and updates them in place as
+Vectors or VectorBatches are added. The sum is compensated (Kahan), and the
+mean and variance use Welford's update for single vectors and Chan et al.'s
+pairwise combination for batches, so they do not drift on long streams the
+way repeatedly adding Vectors does. Accumulators for shards of a stream,
+built in separate processes (they pickle) or threads, combine with
+:py:meth:`Accumulator.merge` into the accumulator of the whole stream.
+
+>>> from linea.vector import Vector
+>>> acc = Accumulator(2)
+>>> for v in (Vector(1, 2), Vector(3, 4), Vector(5, 9)):
+...     acc.add(v)
+>>> print(acc.mean())
+[3.0; 5.0]
+>>> print(acc.variance())
+[2.6666666666666665; 8.666666666666666]
+
+Components:
+
++ class Accumulator
+"""
+import numpy
+
+from .batch import VectorBatch
+from .vector import NonConformantVectors, Vector
+
+
+class Accumulator:
+    """
+    The running count, sum, mean and per-component variance of a stream of
+    real vectors of the given dimension, accumulated in the floating point
+    dtype (float64 by default) whatever the vectors' own dtype.
+    """
+
+    def __init__(self, dimension, dtype=numpy.float64):
+        self.dimension = dimension
+        self.dtype = numpy.dtype(dtype)
+        self.count = 0
+        self._sum = numpy.zeros(dimension, self.dtype)
+        # The Kahan compensation: the true sum is _sum - _error.
+        self._error = numpy.zeros(dimension, self.dtype)
+        self._mean = numpy.zeros(dimension, self.dtype)
+        # The sum of squared deviations from the mean.
+        self._m2 = numpy.zeros(dimension, self.dtype)
+        self._work = numpy.empty((2, dimension), self.dtype)
+
+    def __repr__(self):
+        return 'Accumulator[{}, count={}]'.format(self.dimension, self.count)
+
+    def _check(self, dimension):
+        if dimension != self.dimension:
+            raise NonConformantVectors(self.dimension, dimension)
+
+    def _add_sum(self, x):
+        """Add the array x to the compensated sum."""
+        (y, t) = self._work
+        numpy.subtract(x, self._error, out=y)
+        numpy.add(self._sum, y, out=t)
+        numpy.subtract(t, self._sum, out=self._error)
+        self._error -= y
+        self._sum[...] = t
+
+    def add(self, v):
+        """Add the Vector (or 1-D array) v."""
+        x = numpy.asarray(v.v if isinstance(v, Vector) else v)
+        self._check(len(x))
+        self._add_sum(x)
+        self.count += 1
+        (delta, t) = self._work
+        numpy.subtract(x, self._mean, out=delta)
+        numpy.multiply(delta, 1 / self.count, out=t)
+        self._mean += t
+        numpy.subtract(x, self._mean, out=t)
+        t *= delta
+        self._m2 += t
+
+    def add_batch(self, batch):
+        """Add every row of a VectorBatch or 2-D array."""
+        rows = batch.v if isinstance(batch, VectorBatch) else numpy.asarray(batch)
+        if rows.ndim != 2:
+            raise ValueError('add_batch needs a two-dimensional batch')
+        self._check(rows.shape[1])
+        if not len(rows):
+            return
+        mean = rows.mean(axis=0, dtype=self.dtype)
+        deviations = rows - mean
+        m2 = numpy.einsum('ij,ij->j', deviations, deviations)
+        self._combine(len(rows), rows.sum(axis=0, dtype=self.dtype), mean, m2)
+
+    def merge(self, other):
+        """
+        Add everything accumulated by other, an Accumulator of the same
+        dimension, to this one. Returns this accumulator.
+        """
+        self._check(other.dimension)
+        if other.count:
+            self._combine(other.count, other._sum - other._error,
+                          other._mean, other._m2)
+        return self
+
+    def _combine(self, count, total, mean, m2):
+        """Merge the statistics of count vectors into this accumulator."""
+        self._add_sum(total)
+        n = self.count + count
+        (delta, t) = self._work
+        numpy.subtract(mean, self._mean, out=delta)
+        numpy.multiply(delta, count / n, out=t)
+        self._mean += t
+        numpy.multiply(delta, delta, out=t)
+        t *= self.count * count / n
+        self._m2 += t
+        self._m2 += m2
+        self.count = n
+
+    def __iadd__(self, other):
+        """Add a Vector, a VectorBatch or another Accumulator."""
+        if isinstance(other, Accumulator):
+            return self.merge(other)
+        if isinstance(other, VectorBatch) or numpy.ndim(other) == 2:
+            self.add_batch(other)
+        else:
+            self.add(other)
+        return self
+
+    def _require(self, minimum=1):
+        if self.count < minimum:
+            raise ValueError('{} vectors accumulated, at least {} needed'.format(
+                self.count, minimum))
+
+    def sum(self):
+        """Return the sum of the vectors as a new Vector."""
+        return Vector(self._sum - self._error)
+
+    def mean(self):
+        """Return the mean (centroid) of the vectors as a new Vector."""
+        self._require()
+        return Vector(self._mean.copy())
+
+    def variance(self, ddof=0):
+        """
+        Return the per-component variance of the vectors as a new Vector,
+        dividing by count - ddof (use ddof=1 for the sample variance).
+        """
+        self._require(ddof + 1)
+        return Vector(self._m2 / (self.count - ddof))
+
+    def std(self, ddof=0):
+        """Return the per-component standard deviation as a new Vector."""
+        return Vector(numpy.sqrt(self.variance(ddof).v))
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+``linea.batch``
+
+Batches of equally-sized vectors stored as a single two-dimensional
+ndarray, with row-wise versions of the :py:mod:`linea.vector` operations.
+
+Components:
+
++ class VectorBatch
+"""
+# pylint: disable=C0103
+import math
+import numpy
+
+from . import util
+from .vector import NonConformantVectors, Vector
+
+
+class VectorBatch:
+    """
+    A VectorBatch holds N vectors of dimension d as one contiguous N x d
+    ndarray. Every operation works on all rows at once and returns either
+    an ndarray with one entry per row or a new VectorBatch.
+
+    The other operand of a binary operation may be a Vector, which is
+    applied to every row, or a VectorBatch with the same number of rows,
+    which is applied row by row.
+    """
+
+    def __init__(self, a, dimension=None):
+        """
+        Initialise a batch from a two-dimensional array-like or from an
+        iterable of Vectors. An empty input gives an empty batch of the
+        given dimension, which is needed only then.
+        >>> print(VectorBatch([[1, 2], [3, 4]]).shape)
+        (2, 2)
+        >>> print(VectorBatch([], dimension=3).shape)
+        (0, 3)
+        """
+        if not isinstance(a, numpy.ndarray):
+            a = [x.v if isinstance(x, Vector) else x for x in a]
+        a = numpy.ascontiguousarray(a)
+        if a.size == 0 and a.ndim == 1:
+            if dimension is None:
+                raise ValueError('an empty VectorBatch needs a dimension')
+            a = a.reshape(0, dimension)
+        if a.ndim == 1:
+            a = a.reshape(1, -1)
+        if a.ndim != 2:
+            raise ValueError('a VectorBatch must be two-dimensional')
+        self.v = a
+
+    @classmethod
+    def from_vectors(cls, vectors):
+        """Build a batch from an iterable of Vectors."""
+        return cls([v.v for v in vectors])
+
+    @property
+    def shape(self):
+        """The (count, dimension) shape of the batch."""
+        return self.v.shape
+
+    @property
+    def dimension(self):
+        """The dimension of each vector in the batch."""
+        return self.v.shape[1]
+
+    def __len__(self):
+        return self.v.shape[0]
+
+    def __iter__(self):
+        return (Vector(row) for row in self.v)
+
+    def __getitem__(self, item):
+        rows = self.v[item]
+        if rows.ndim == 1:
+            return Vector(rows)
+        return VectorBatch(rows)
+
+    def __repr__(self):
+        return 'VectorBatch[{}x{}]'.format(*self.shape)
+
+    def _operand(self, other):
+        """
+        Return the rows of other as an ndarray that broadcasts against this
+        batch, checking that the dimensions conform.
+        """
+        if isinstance(other, VectorBatch):
+            if other.dimension != self.dimension:
+                raise NonConformantVectors(self.dimension, other.dimension)
+            if len(other) != len(self) and len(other) != 1:
+                raise ValueError('batches hold {} and {} vectors'.format(
+                    len(self), len(other)))
+            if len(other) == 1:
+                return other.v[0]
+            return other.v
+        if len(other) != self.dimension:
+            raise NonConformantVectors(self.dimension, len(other))
+        return numpy.asarray(other.v)
+
+    def magnitude(self):
+        """Return the magnitude of every vector in the batch."""
+        return numpy.sqrt(numpy.einsum('ij,ij->i', self.v, self.v))
+
+    def is_zero(self, tolerance=util.EQUALITY_TOLERANCE):
+        """Return a boolean array marking the zero vectors in the batch."""
+        return numpy.isclose(self.magnitude(), 0, tolerance)
+
+    def unit(self):
+        """
+        Return the unit vectors of the batch. If any vector in the batch is
+        a zero vector, a ValueError will be thrown.
+        """
+        mag = self.magnitude()
+        if numpy.isclose(mag, 0, util.EQUALITY_TOLERANCE).any():
+            raise ValueError("cannot normalise the zero vector")
+        return VectorBatch(self.v * (1 / mag)[:, None])
+
+    def dot(self, other):
+        """Return the row-wise dot product with other."""
+        w = self._operand(other)
+        if w.ndim == 1:
+            return self.v @ w
+        return numpy.einsum('ij,ij->i', self.v, w)
+
+    def angle(self, other, in_degrees=False, tolerance=util.EQUALITY_TOLERANCE):
+        """
+        Return the row-wise angle with other in radians, or in degrees if
+        in_degrees is True.
+        """
+        try:
+            w = self._operand(other)
+        except NonConformantVectors as err:
+            raise ValueError('Cannot determine the angle between the zero vector '
+                             'and another vector.') from err
+        # the cosine is formed as vector.angle forms it, so the two agree
+        v_magnitude = self.magnitude()
+        w_magnitude = numpy.sqrt(numpy.einsum('...i,...i->...', w, w))
+        if (numpy.isclose(v_magnitude, 0, util.EQUALITY_TOLERANCE).any() or
+                numpy.isclose(w_magnitude, 0, util.EQUALITY_TOLERANCE).any()):
+            raise ValueError("cannot normalise the zero vector")
+        inner = self.dot(other) / (v_magnitude * w_magnitude)
+        theta = util.arccos_clamped(inner, tolerance)
+        if in_degrees:
+            theta = theta * 180 / math.pi
+        return theta
+
+    def parallel_to(self, other, tolerance=util.EQUALITY_TOLERANCE):
+        """Return a boolean array marking the rows parallel to other."""
+        w = self._operand(other)
+        zero = self.is_zero() | numpy.isclose(
+            numpy.sqrt(numpy.einsum('...i,...i->...', w, w)), 0,
+            util.EQUALITY_TOLERANCE)
+        result = numpy.ones(len(self), dtype=bool)
+        if zero.all():
+            return result
+        rows = ~zero
+        theta = VectorBatch(self.v[rows]).angle(
+            _take(other, rows), tolerance=tolerance)
+        result[rows] = (numpy.isclose(theta, 0, tolerance) |
+                        numpy.isclose(theta, math.pi, tolerance))
+        return result
+
+    def orthogonal_to(self, other, tolerance=util.EQUALITY_TOLERANCE):
+        """Return a boolean array marking the rows orthogonal to other."""
+        w = self._operand(other)
+        zero = self.is_zero() | numpy.isclose(
+            numpy.sqrt(numpy.einsum('...i,...i->...', w, w)), 0,
+            util.EQUALITY_TOLERANCE)
+        return zero | numpy.isclose(self.dot(other), 0, tolerance)
+
+    def project_parallel(self, basis):
+        """
+        Return the projection of every row onto basis, which may be a
+        single Vector or a batch of per-row basis vectors.
+        """
+        self._operand(basis)
+        unit_basis = basis.unit()
+        coeff = self.dot(unit_basis)
+        return VectorBatch(coeff[:, None] * unit_basis.v)
+
+    def project_orthogonal(self, basis):
+        """
+        Return the component of every row orthogonal to basis.
+        """
+        return VectorBatch(self.v - self.project_parallel(basis).v)
+
+    def cross(self, other, out=None):
+        """
+        Return the row-wise cross product with other as a VectorBatch; both
+        must be 3D. If out, an N x 3 array, is given the result is written
+        into it.
+        """
+        if self.dimension != 3:
+            raise NonConformantVectors(3, self.dimension)
+        w = self._operand(other)
+        if out is None:
+            out = numpy.empty(self.shape, dtype=numpy.result_type(self.v, w))
+        _cross(self.v, w, out)
+        return VectorBatch(out)
+
+    def area_parallelogram(self, other):
+        """
+        Return the areas of the parallelograms formed by each row and
+        other.
+        """
+        return self.cross(other).magnitude()
+
+    def area_triangle(self, other):
+        """Return the areas of the triangles formed by each row and other."""
+        return 0.5 * self.area_parallelogram(other)
+
+
+def _cross(a, b, out):
+    """Write the row-wise cross product of a and b into out."""
+    (x1, y1, z1) = (a[..., 0], a[..., 1], a[..., 2])
+    (x2, y2, z2) = (b[..., 0], b[..., 1], b[..., 2])
+    # out must not share memory with a or b: each component is written
+    # before the next is read.
+    numpy.subtract(y1 * z2, y2 * z1, out=out[:, 0])
+    numpy.subtract(x2 * z1, x1 * z2, out=out[:, 1])
+    numpy.subtract(x1 * y2, x2 * y1, out=out[:, 2])
+
+
+def _take(other, rows):
+    """Select rows from other if it is a batch; vectors are shared."""
+    if isinstance(other, VectorBatch) and len(other) != 1:
+        return VectorBatch(other.v[rows])
+    return other
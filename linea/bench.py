@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+``linea.bench``
+
+Micro-benchmarks for every public operation in :py:mod:`linea.vector`,
+and for grouping a batch of vectors with :py:mod:`linea.group`.
+
+Each operation is timed over a matrix of dimensions and dtypes and
+reported as operations per second, percentiles of the latency of single
+calls and the bytes allocated by a single call. Results can be written as JSON and compared
+against a saved baseline, in which case any operation that slowed down by
+more than a threshold is reported as a regression and the run fails.
+
+Run it as ``python -m linea.bench`` or, once installed, ``linea-bench``::
+
+    linea-bench --dims 3 1000 --output current.json --baseline saved.json
+
+Components:
+
++ function: run
++ function: measure
++ function: compare
++ function: main
+"""
+import argparse
+import functools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy
+
+from . import group, vector
+
+DIMENSIONS = (3, 100, 10000)
+DTYPES = ('float64', 'float32')
+PERCENTILES = (50, 90, 99)
+# The most single calls timed for the latency percentiles.
+MAX_CALLS = 10000
+THRESHOLD = 0.25
+# The number of vectors the grouping benchmarks partition; their cost per
+# vector should not grow with it, or with the dimension.
+GROUP_ROWS = 2000
+
+
+def _vectors(dim, dtype):
+    rng = numpy.random.default_rng(dim)
+    return [vector.Vector(rng.standard_normal(dim).astype(dtype))
+            for _ in range(2)]
+
+
+def _rows(v, rows=GROUP_ROWS):
+    """Return rows random vectors of v's dimension and dtype."""
+    rng = numpy.random.default_rng(rows)
+    return rng.standard_normal((rows, len(v))).astype(v.v.dtype)
+
+
+# Each operation maps a (dimension, dtype) pair to a zero-argument
+# callable; operations that only exist for some dimensions list them.
+OPERATIONS = [
+    ('construct', None, lambda v, w: (lambda: vector.Vector(v.v))),
+    ('add', None, lambda v, w: (lambda: v + w)),
+    ('sub', None, lambda v, w: (lambda: v - w)),
+    ('mul', None, lambda v, w: (lambda: v * 2.5)),
+    ('magnitude', None, lambda v, w: v.magnitude),
+    ('unit', None, lambda v, w: v.unit),
+    ('dot', None, lambda v, w: (lambda: vector.dot(v, w))),
+    ('angle', None, lambda v, w: (lambda: vector.angle(v, w))),
+    ('parallel', None, lambda v, w: (lambda: vector.parallel(v, w))),
+    ('orthogonal', None, lambda v, w: (lambda: vector.orthogonal(v, w))),
+    ('project_parallel', None, lambda v, w: (lambda: v.project_parallel(w))),
+    ('project_orthogonal', None,
+     lambda v, w: (lambda: v.project_orthogonal(w))),
+    ('cross', (3,), lambda v, w: (lambda: vector.cross(v, w))),
+    ('area_parallelogram', (3,),
+     lambda v, w: (lambda: vector.area_parallelogram(v, w))),
+    ('area_triangle', (3,), lambda v, w: (lambda: vector.area_triangle(v, w))),
+    # Run with --dims 1000 as well to check the grouping stays near-linear
+    # at high dimension: parallel_groups_4x should take about 4 times as
+    # long as parallel_groups.
+    ('parallel_groups', (3, 100, 1000),
+     lambda v, w: functools.partial(group.parallel_groups, _rows(v))),
+    ('parallel_groups_4x', (3, 100, 1000),
+     lambda v, w: functools.partial(group.parallel_groups, _rows(v, 4 * GROUP_ROWS))),
+    ('dedupe', (3, 100, 1000), lambda v, w: functools.partial(group.dedupe, _rows(v))),
+]
+
+
+def measure(fn, samples=25, min_time=0.002):
+    """
+    Time fn and return a dict with its operations per second, percentiles
+    of the latency of single calls in seconds and the bytes allocated by
+    one call.
+
+    The throughput is the median over samples that each run fn enough
+    times to take at least min_time seconds, which keeps timer resolution
+    out of it for fast operations. The percentiles come from timing as
+    many single calls as those samples made, up to MAX_CALLS, so they
+    include the timer's own overhead of well under a microsecond.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= min_time:
+            break
+        number *= 2
+
+    means = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        means.append((time.perf_counter() - start) / number)
+
+    latencies = []
+    for _ in range(max(samples, min(samples * number, MAX_CALLS))):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn()
+    allocated = tracemalloc.get_traced_memory()[1] - base
+    if not tracing:
+        tracemalloc.stop()
+
+    result = {'ops_per_sec': 1 / numpy.median(means),
+              'bytes_allocated': allocated}
+    for p in PERCENTILES:
+        result['p{}'.format(p)] = float(numpy.percentile(latencies, p))
+    return result
+
+
+def run(dims=DIMENSIONS, dtypes=DTYPES, operations=None, samples=25,
+        min_time=0.002):
+    """
+    Benchmark the operations (by default, all of them) for every
+    combination of dims and dtypes. Returns a JSON-serialisable dict whose
+    results are keyed by ``operation/dimension/dtype``.
+    """
+    results = {}
+    for dim in dims:
+        for dtype in dtypes:
+            v, w = _vectors(dim, dtype)
+            for (name, only, make) in OPERATIONS:
+                if operations and name not in operations:
+                    continue
+                if only and dim not in only:
+                    continue
+                key = '{}/{}/{}'.format(name, dim, dtype)
+                results[key] = measure(make(v, w), samples, min_time)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': numpy.__version__,
+            'machine': platform.machine(),
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold=THRESHOLD):
+    """
+    Return a list of (key, baseline ops/sec, current ops/sec) for every
+    benchmark present in both runs whose throughput dropped by more than
+    threshold (a fraction of the baseline).
+    """
+    regressions = []
+    for key, base in sorted(baseline['results'].items()):
+        now = current['results'].get(key)
+        if now is None:
+            continue
+        if now['ops_per_sec'] < base['ops_per_sec'] * (1 - threshold):
+            regressions.append((key, base['ops_per_sec'], now['ops_per_sec']))
+    return regressions
+
+
+def _report(results, out):
+    fmt = '{:<34} {:>14} {:>10} {:>10} {:>10} {:>10}\n'
+    out.write(fmt.format('benchmark', 'ops/sec', 'p50 us', 'p90 us',
+                         'p99 us', 'bytes'))
+    for key, r in results['results'].items():
+        out.write(fmt.format(key, '{:.0f}'.format(r['ops_per_sec']),
+                             '{:.2f}'.format(r['p50'] * 1e6),
+                             '{:.2f}'.format(r['p90'] * 1e6),
+                             '{:.2f}'.format(r['p99'] * 1e6),
+                             r['bytes_allocated']))
+
+
+def main(argv=None):
+    """Command line entry point; returns the process exit status."""
+    parser = argparse.ArgumentParser(
+        prog='linea-bench', description='Benchmark linea.vector.')
+    parser.add_argument('--dims', type=int, nargs='+', default=DIMENSIONS,
+                        help='vector dimensions to benchmark')
+    parser.add_argument('--dtypes', nargs='+', default=DTYPES,
+                        help='numpy dtypes to benchmark')
+    parser.add_argument('--ops', nargs='+', default=None,
+                        choices=[op[0] for op in OPERATIONS],
+                        help='operations to benchmark (default: all)')
+    parser.add_argument('--samples', type=int, default=25,
+                        help='latency samples per benchmark')
+    parser.add_argument('--output', help='write the results as JSON here')
+    parser.add_argument('--baseline', help='compare against this JSON file')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='allowed fractional slowdown against baseline')
+    args = parser.parse_args(argv)
+
+    results = run(args.dims, args.dtypes, args.ops, args.samples)
+    _report(results, sys.stdout)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for (key, before, after) in regressions:
+            sys.stdout.write('REGRESSION {}: {:.0f} -> {:.0f} ops/sec\n'.format(
+                key, before, after))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
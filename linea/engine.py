@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+``linea.engine``
+
+An asyncio front end that coalesces single-pair vector queries into
+batches.
+
+Each awaitable request (``await engine.angle(v, w)``) is queued; a
+collector task takes up to max_batch queued requests, waiting at most
+max_wait seconds after the first for more to arrive, groups them by
+operation and dimension and runs every group through the vectorised
+:py:class:`linea.batch.VectorBatch` kernels in a worker thread. Each
+request's future is then resolved with its own result, as computed by
+the batched kernel; these match the scalar functions to within rounding.
+If a batched kernel raises (say, one request has a zero vector), the
+group is re-run one request at a time through :py:mod:`linea.vector`, so
+every request gets the result or exception the scalar function would
+give. If running a group fails outright (say, the executor has been shut
+down), its requests get that exception instead.
+
+Components:
+
++ class AsyncVectorEngine
+"""
+import asyncio
+import collections
+import math
+
+from . import vector
+from .batch import VectorBatch
+
+OPERATIONS = {
+    'dot': (vector.dot, lambda vs, ws: vs.dot(ws).tolist()),
+    'angle': (vector.angle, lambda vs, ws: vs.angle(ws).tolist()),
+    'project_parallel': (lambda v, w: v.project_parallel(w),
+                         lambda vs, ws: list(vs.project_parallel(ws))),
+    'project_orthogonal': (lambda v, w: v.project_orthogonal(w),
+                           lambda vs, ws: list(vs.project_orthogonal(ws))),
+}
+
+
+def _run_group(op, pairs):
+    """
+    Return a list of (result, exception) for the (v, w) pairs, batched if
+    possible and one at a time otherwise.
+    """
+    scalar, batched = OPERATIONS[op]
+    try:
+        if len(pairs) > 1:
+            vs = VectorBatch([v.v for (v, _) in pairs])
+            ws = VectorBatch([w.v for (_, w) in pairs])
+            return [(r, None) for r in batched(vs, ws)]
+    except Exception:  # pylint: disable=W0703
+        pass
+    results = []
+    for (v, w) in pairs:
+        try:
+            results.append((scalar(v, w), None))
+        except Exception as e:  # pylint: disable=W0703
+            results.append((None, e))
+    return results
+
+
+class AsyncVectorEngine:
+    """
+    Coalesces awaitable dot, angle and projection requests into batches.
+    Use it as an async context manager, or call start() and close().
+    executor is the concurrent.futures executor the batches run on; the
+    event loop's default thread pool is used if it is None.
+    """
+
+    def __init__(self, max_batch=256, max_wait=0.001, executor=None):
+        if max_batch < 1:
+            raise ValueError('max_batch must be at least 1')
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.executor = executor
+        self._queue = None
+        self._task = None
+        self.requests = 0
+        self.batches = 0
+        self.max_batch_seen = 0
+        self.batch_sizes = collections.Counter()
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def start(self):
+        """Start the collector task on the running event loop."""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._collect())
+
+    async def close(self):
+        """Finish the queued requests and stop the collector task."""
+        if self._task is None:
+            return
+        if not self._task.done():
+            # If the collector dies meanwhile, the queue is never drained.
+            join = asyncio.ensure_future(self._queue.join())
+            await asyncio.wait([join, self._task], return_when=asyncio.FIRST_COMPLETED)
+            join.cancel()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._task = None
+
+    def metrics(self):
+        """
+        Return a snapshot of the queue depth, request and batch counts, the
+        mean and largest batch sizes and a histogram of batch sizes.
+        """
+        return {
+            'queue_depth': self._queue.qsize() if self._queue else 0,
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'max_batch_size': self.max_batch_seen,
+            'batch_sizes': dict(self.batch_sizes),
+        }
+
+    async def submit(self, op, v, w):
+        """Queue the operation op on the pair (v, w) and await its result."""
+        if op not in OPERATIONS:
+            raise ValueError('unknown operation {!r}'.format(op))
+        if self._task is not None and self._task.done():
+            # The collector died; raise its exception rather than queue a
+            # request nothing will answer. The next request starts afresh.
+            (task, self._task) = (self._task, None)
+            task.result()
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, v, w, future))
+        return await future
+
+    async def dot(self, v, w):
+        """Return the dot product of v and w."""
+        return await self.submit('dot', v, w)
+
+    async def angle(self, v, w, in_degrees=False):
+        """
+        Return the angle between v and w in radians, or in degrees if
+        in_degrees is True.
+        """
+        theta = await self.submit('angle', v, w)
+        return math.degrees(theta) if in_degrees else theta
+
+    async def project_parallel(self, v, basis):
+        """Return the projection of v onto basis."""
+        return await self.submit('project_parallel', v, basis)
+
+    async def project_orthogonal(self, v, basis):
+        """Return the component of v orthogonal to basis."""
+        return await self.submit('project_orthogonal', v, basis)
+
+    async def _gather(self):
+        """Wait for a request, then collect a batch of up to max_batch."""
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _collect(self):
+        try:
+            await self._serve()
+        except Exception as e:
+            # Fail the requests still queued, which nothing will serve.
+            while not self._queue.empty():
+                future = self._queue.get_nowait()[3]
+                if not future.done():
+                    future.set_exception(e)
+                self._queue.task_done()
+            raise
+
+    async def _run(self, op, requests):
+        """Run one group of requests and resolve their futures."""
+        pairs = [(v, w) for (_, v, w, _) in requests]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _run_group, op, pairs)
+        except Exception as e:  # pylint: disable=W0703
+            results = [(None, e)] * len(requests)
+        for ((_, _, _, future), (result, error)) in zip(requests, results):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    async def _serve(self):
+        while True:
+            batch = await self._gather()
+            self.requests += len(batch)
+            self.batches += 1
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self.batch_sizes[len(batch)] += 1
+
+            try:
+                groups = collections.defaultdict(list)
+                for request in batch:
+                    (op, v, w, _) = request
+                    try:
+                        key = (op, len(v), len(w))
+                    except TypeError:
+                        # Run operands without a length on their own, so
+                        # they fail as the scalar function would.
+                        key = (op, id(request))
+                    groups[key].append(request)
+                for (key, requests) in groups.items():
+                    await self._run(key[0], requests)
+            finally:
+                for (_, _, _, future) in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError('the engine stopped'))
+                    self._queue.task_done()
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+"""
+``linea.group``
+
+Partitioning large collections of vectors into groups in near-linear time
+by hashing on quantised vectors, instead of comparing every pair.
+
+parallel_groups quantises unit vectors. dedupe and the approximate-equality
+containers quantise the vectors themselves on a grid whose cells widen
+with the magnitude of the components, in step with the relative tolerance
+of ``==``, so vectors that compare equal always lie in the same or a
+neighbouring cell. Every component is part of the cell, so sparse
+vectors with different supports land in different cells.
+
+Components:
+
++ function: parallel_groups
++ function: dedupe
++ class ApproximateDict
++ class ApproximateSet
+"""
+import functools
+import math
+import numpy
+
+from . import util
+from .batch import VectorBatch
+from .vector import NonConformantVectors, Vector  # pylint: disable=unused-import
+
+# The fewest and most random directions the unit vectors are projected
+# onto before quantising; probing neighbouring cells, for a vector and its
+# negation, costs up to 2 ** (projections + 1).
+PROJECTIONS = 4
+MAX_PROJECTIONS = 16
+
+# The absolute tolerance numpy.isclose, and so Vector.__eq__, adds to the
+# relative one.
+ATOL = 1e-08
+# The width of an equality cell, in units of the probe radius; vectors are
+# probed in a neighbouring cell along an axis only when within the radius
+# of its boundary. Cells widen to CELL_SPREAD times the dimension, so that
+# a vector lies near a boundary along few axes even when it has many.
+CELL_WIDTH = 256
+CELL_SPREAD = 8
+# A vector near a boundary along more axes than this is compared with
+# every group instead of probing up to 2 ** PROBE_AXES cells.
+PROBE_AXES = 10
+
+
+def _as_batch(vectors):
+    if isinstance(vectors, VectorBatch):
+        return vectors
+    return VectorBatch(vectors)
+
+
+def _projections(dimension, count, width):
+    """
+    Return how many directions to project count unit vectors onto so that
+    they spread over many more than count cells of the given width. A
+    random unit vector's projection has a spread of about
+    1 / sqrt(dimension), so each direction adds about
+    log2(sqrt(2 pi e) / (sqrt(dimension) * width)) bits to the cell, and
+    never less than the one bit of its sign.
+    """
+    spread = math.sqrt(2 * math.pi * math.e / dimension) / width
+    bits = max(1.0, math.log2(spread))
+    k = math.ceil((math.log2(count) + 4) / bits)
+    return min(dimension, max(PROJECTIONS, min(MAX_PROJECTIONS, k)))
+
+
+def _projection(dimension, k, seed):
+    """Return a dimension x k matrix with orthonormal columns."""
+    rng = numpy.random.default_rng(seed)
+    q, _ = numpy.linalg.qr(rng.standard_normal((dimension, k)))
+    return q
+
+
+def _cells(points, width, radius):
+    """
+    Yield, for every row of points, the grid cells within radius of it. A
+    neighbouring cell is only probed along the axes where the point lies
+    within radius of the cell boundary.
+    """
+    scaled = points / width
+    base = numpy.floor(scaled).astype(numpy.int64)
+    frac = scaled - base
+    # -1 or 1 along the axes within radius of a cell boundary, 0 elsewhere
+    steps = (frac > 1 - radius / width).astype(numpy.int64) - (frac < radius / width)
+    for (cell, step) in zip(base.tolist(), steps.tolist()):
+        probes = [tuple(cell)]
+        for (axis, s) in enumerate(step):
+            if s:
+                probes += [p[:axis] + (p[axis] + s,) + p[axis + 1:] for p in probes]
+        yield probes
+
+
+def _join(cells, groups, i, probes, matches):
+    """
+    Add i to the first group homed in one of the probed cells whose
+    representative satisfies matches, or else start a new group homed in
+    the first probed cell. A None probe stands for every cell.
+    """
+    for cell in probes:
+        for g in cells.get(cell, ()) if cell is not None else range(len(groups)):
+            if matches(groups[g][0]):
+                groups[g].append(i)
+                return
+    cells.setdefault(probes[0], []).append(len(groups))
+    groups.append([i])
+
+
+def _canonical(units):
+    """
+    Return (units, sign): the unit vectors flipped so that their
+    largest-magnitude components are positive, and the signs they were
+    multiplied by.
+    """
+    largest = numpy.abs(units).argmax(axis=1)
+    sign = numpy.sign(units[numpy.arange(len(units)), largest])
+    return units * sign[:, None], sign
+
+
+def _group_units(units, sign, tolerance, seed):
+    """
+    Group the canonical unit vectors units, whose original directions are
+    units * sign, returning lists of row indices.
+    """
+    # Parallel vectors' canonical unit vectors are at most this far apart,
+    # and projection onto orthonormal directions never increases distance.
+    radius = 1e-08 + tolerance * math.pi
+    width = 8 * radius
+    k = _projections(units.shape[1], len(units), width)
+    points = units @ _projection(units.shape[1], k, seed)
+
+    def parallel(i, rep):
+        # compare the original directions, as parallel would
+        cos = float(numpy.dot(units[i], units[rep]) * sign[i] * sign[rep])
+        theta = util.acos_clamped(min(1.0, max(-1.0, cos)), tolerance)
+        return (util.isclose(theta, 0, tolerance) or
+                util.isclose(theta, math.pi, tolerance))
+
+    groups = []
+    cells = {}
+    for (i, probes, negated) in zip(range(len(units)), _cells(points, width, radius),
+                                    _cells(-points, width, radius)):
+        _join(cells, groups, i, probes + negated, lambda rep, i=i: parallel(i, rep))
+    return groups
+
+
+def parallel_groups(vectors, tolerance=util.EQUALITY_TOLERANCE, seed=0):
+    """
+    Partition vectors (a VectorBatch, 2-D array or iterable of Vectors) into
+    groups of parallel vectors, returning (groups, zeros): a list of lists
+    of indices, and the indices of the zero vectors.
+
+    Each vector is compared, using the tolerance rules of vector.parallel,
+    only with the first member (the representative) of groups whose
+    quantised unit vectors lie in a nearby grid cell. Every member is
+    therefore parallel to its group's representative; since parallel is not
+    transitive under a tolerance, two members are not guaranteed to be
+    parallel to each other.
+
+    Unit vectors are canonicalised so their largest-magnitude component is
+    positive, which puts anti-parallel vectors in the same cell; the
+    opposite sign is probed as well for vectors whose largest components
+    nearly tie.
+
+    >>> parallel_groups([[1, 2], [-2, -4], [0, 0], [2, 1]])
+    ([[0, 1], [3]], [2])
+    """
+    batch = _as_batch(vectors)
+    mag = batch.magnitude()
+    zero = numpy.isclose(mag, 0, util.EQUALITY_TOLERANCE)
+    zeros = numpy.nonzero(zero)[0].tolist()
+    rows = numpy.nonzero(~zero)[0]
+    if len(rows) == 0:
+        return [], zeros
+
+    (units, sign) = _canonical(batch.v[rows] / mag[rows, None])
+    groups = _group_units(units, sign, tolerance, seed)
+    return [rows[g].tolist() for g in groups], zeros
+
+
+def _scale(a, tolerance):
+    """
+    Map components onto a scale on which the tolerance of
+    numpy.isclose(x, y, tolerance) is about one unit everywhere: its slope
+    at x is 1 / (ATOL + tolerance * |x|).
+    """
+    if tolerance == 0:
+        return a / ATOL
+    return numpy.sign(a) * numpy.log1p(numpy.abs(a) * (tolerance / ATOL)) / tolerance
+
+
+def _radius(tolerance):
+    """
+    Return how many units of _scale apart equal components can be: at most
+    1 / (1 - tolerance), with room for rounding.
+    """
+    if not 0 <= tolerance < 1:
+        raise ValueError('tolerance must be at least 0 and less than 1')
+    return 1.01 / (1 - tolerance)
+
+
+def _wrap(h):
+    """Return h wrapped to a signed 64-bit integer, as numpy wraps it."""
+    return (h + 2 ** 63) % 2 ** 64 - 2 ** 63
+
+
+@functools.lru_cache(maxsize=None)
+def _hash_weights(dimension):
+    """Return the fixed random weights of the cell hash."""
+    return numpy.random.default_rng(0).integers(
+        -2 ** 63, 2 ** 63 - 1, dimension, dtype=numpy.int64, endpoint=True)
+
+
+def _equality_cells(scaled, radius):
+    """
+    Yield the cells to probe for every row of scaled, each as a random
+    linear hash of the cell's coordinates, so probing a neighbour costs one
+    addition however many components there are; a collision only adds
+    candidates to compare. A None probe stands for every cell. Cells are
+    centred on zero so that zero components, common in real data, never
+    need a probe.
+    """
+    width = max(CELL_WIDTH, CELL_SPREAD * scaled.shape[1]) * radius
+    scaled = scaled / width + 0.5
+    base = numpy.floor(scaled).astype(numpy.int64)
+    frac = scaled - base
+    # -1 or 1 along the axes within radius of a cell boundary, 0 elsewhere
+    steps = (frac > 1 - radius / width).astype(numpy.int64) - (frac < radius / width)
+    weights = _hash_weights(scaled.shape[1])
+    for (home, step) in zip((base @ weights).tolist(), steps):
+        axes = numpy.flatnonzero(step)
+        if len(axes) > PROBE_AXES:
+            yield [home, None]
+            continue
+        probes = [home]
+        for (s, w) in zip(step[axes].tolist(), weights[axes].tolist()):
+            probes += [_wrap(p + s * w) for p in probes]
+        yield probes
+
+
+def dedupe(vectors, tolerance=util.EQUALITY_TOLERANCE):
+    """
+    Group the near-equal vectors in vectors (a VectorBatch, 2-D array or
+    iterable of Vectors), returning (representatives, groups): the indices
+    of the vectors to keep, and a list of lists of indices, each starting
+    with its representative.
+
+    A vector joins the first group whose representative it equals, using
+    the rule of Vector.__eq__ (numpy.isclose with rtol=tolerance against
+    the representative's components); otherwise it starts a new group.
+    Only representatives in the same or a neighbouring cell are compared;
+    a vector near the cell boundaries along more than PROBE_AXES axes is
+    compared with them all. Many distinct vectors that are all within a
+    cell width of each other, relative to their size, share cells and are
+    compared one by one. As equality under a tolerance is not transitive,
+    two members of a group are not guaranteed to equal each other.
+
+    >>> dedupe([[1, 2], [1.000001, 2], [2, 1], [1, 2.0000001]])
+    ([0, 2], [[0, 1, 3], [2]])
+    """
+    radius = _radius(tolerance)
+    rows = _as_batch(vectors).v
+    if len(rows) == 0:
+        return [], []
+    scaled = _scale(rows, tolerance)
+    groups = []
+    cells = {}
+    for (i, probes) in enumerate(_equality_cells(scaled, radius)):
+        _join(cells, groups, i, probes,
+              lambda rep, row=rows[i]: numpy.isclose(row, rows[rep], tolerance).all())
+    return [g[0] for g in groups], groups
+
+
+class ApproximateDict:
+    """
+    A mapping whose keys are Vectors, looked up with the tolerance of ==:
+    d[v] finds the stored key k for which v == k. Setting an item whose key
+    equals a stored key replaces that key's value and keeps the stored key.
+    Keys are stored as FrozenVector copies, so later changes to the vector
+    passed in do not affect the mapping.
+
+    >>> d = ApproximateDict()
+    >>> d[Vector(1, 2)] = 'a'
+    >>> d[Vector(1.000001, 2)]
+    'a'
+    """
+
+    def __init__(self, items=(), tolerance=util.EQUALITY_TOLERANCE):
+        self.tolerance = tolerance
+        self.dimension = None
+        self._radius = _radius(tolerance)
+        self._cells = {}
+        # id -> (home cell, key, value)
+        self._entries = {}
+        self._next = 0
+        if hasattr(items, 'items'):
+            items = items.items()
+        for (key, value) in items:
+            self[key] = value
+
+    def _locate(self, key):
+        """Return (home cell, entry id or None) for key."""
+        if self.dimension is None:
+            self.dimension = len(key)
+        elif len(key) != self.dimension:
+            raise NonConformantVectors(self.dimension, len(key))
+        a = numpy.asarray(key.v)
+        scaled = _scale(a, self.tolerance)
+        probes = next(_equality_cells(scaled.reshape(1, -1), self._radius))
+        for cell in probes:
+            for i in self._cells.get(cell, ()) if cell is not None else list(self._entries):
+                if numpy.isclose(a, self._entries[i][1].v, self.tolerance).all():
+                    return probes[0], i
+        return probes[0], None
+
+    def find(self, key):
+        """Return the stored key equal to key, or None."""
+        i = self._locate(key)[1]
+        return None if i is None else self._entries[i][1]
+
+    def __getitem__(self, key):
+        i = self._locate(key)[1]
+        if i is None:
+            raise KeyError(key)
+        return self._entries[i][2]
+
+    def get(self, key, default=None):
+        """Return the value for key, or default if there is none."""
+        i = self._locate(key)[1]
+        return default if i is None else self._entries[i][2]
+
+    def __setitem__(self, key, value):
+        (home, i) = self._locate(key)
+        if i is not None:
+            (home, stored, _) = self._entries[i]
+            self._entries[i] = (home, stored, value)
+            return
+        self._entries[self._next] = (home, key.freeze(), value)
+        self._cells.setdefault(home, []).append(self._next)
+        self._next += 1
+
+    def __delitem__(self, key):
+        i = self._locate(key)[1]
+        if i is None:
+            raise KeyError(key)
+        home = self._entries.pop(i)[0]
+        self._cells[home].remove(i)
+        if not self._cells[home]:
+            del self._cells[home]
+
+    def __contains__(self, key):
+        return self._locate(key)[1] is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return (key for (_, key, _) in self._entries.values())
+
+    def keys(self):
+        """Return the stored keys."""
+        return list(self)
+
+    def values(self):
+        """Return the values."""
+        return [value for (_, _, value) in self._entries.values()]
+
+    def items(self):
+        """Return the (key, value) pairs."""
+        return [(key, value) for (_, key, value) in self._entries.values()]
+
+
+class ApproximateSet:
+    """
+    A set of Vectors that holds at most one of any group of vectors equal
+    under the tolerance of ==: adding a vector equal to a member leaves the
+    set unchanged. The members are FrozenVector copies.
+
+    >>> s = ApproximateSet([Vector(1, 2), Vector(1.000001, 2), Vector(2, 1)])
+    >>> len(s)
+    2
+    """
+
+    def __init__(self, vectors=(), tolerance=util.EQUALITY_TOLERANCE):
+        self._members = ApproximateDict(tolerance=tolerance)
+        for v in vectors:
+            self.add(v)
+
+    @property
+    def tolerance(self):
+        """The relative tolerance of the equality test."""
+        return self._members.tolerance
+
+    def add(self, v):
+        """
+        Add v unless an equal vector is already a member, returning the
+        member that represents it.
+        """
+        found = self._members.find(v)
+        if found is not None:
+            return found
+        self._members[v] = None
+        return self._members.find(v)
+
+    def find(self, v):
+        """Return the member equal to v, or None."""
+        return self._members.find(v)
+
+    def discard(self, v):
+        """Remove the member equal to v, if there is one."""
+        if v in self._members:
+            del self._members[v]
+
+    def remove(self, v):
+        """Remove the member equal to v, raising KeyError if there is none."""
+        del self._members[v]
+
+    def __contains__(self, v):
+        return v in self._members
+
+    def __len__(self):
+        return len(self._members)
+
+    def __iter__(self):
+        return iter(self._members)
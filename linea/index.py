@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+``linea.index``
+
+Nearest-neighbour indexes answering "which stored vectors have the
+smallest angle (or largest dot product) with this query?".
+
+:py:class:`ExactIndex` keeps the stored vectors and their unit vectors in
+contiguous arrays and scores every one of them with a single matrix-vector
+product. :py:class:`LSHIndex` adds random-hyperplane locality-sensitive
+hashing on top, so a query only scores the vectors that share a hash
+bucket with it; more tables, fewer bits or a larger probe radius trade
+speed for recall.
+
+Components:
+
++ class ExactIndex
++ class LSHIndex
+"""
+import itertools
+import numpy
+
+from . import util
+from .vector import NonConformantVectors, Vector
+
+METRICS = ('angle', 'dot')
+
+
+def _rows(vectors, dimension):
+    """
+    Return vectors (a Vector, VectorBatch, array or iterable of vectors or
+    of numbers) as a 2-D array; nothing at all gives zero rows of dimension.
+    """
+    if isinstance(vectors, Vector):
+        return numpy.asarray(vectors.v).reshape(1, -1)
+    if hasattr(vectors, 'v'):
+        return vectors.v
+    if not isinstance(vectors, numpy.ndarray):
+        vectors = numpy.array([v.v if isinstance(v, Vector) else v for v in vectors])
+    if vectors.size == 0:
+        return vectors.reshape(0, dimension)
+    return numpy.atleast_2d(vectors)
+
+
+class ExactIndex:
+    """
+    An exact brute-force index. Vectors are stored under hashable keys;
+    if no keys are given, consecutive integers are assigned.
+
+    Zero vectors may be stored, but never match an angle query since the
+    angle with the zero vector is undefined.
+    """
+
+    def __init__(self, dimension, dtype=numpy.float64):
+        self.dimension = dimension
+        self._data = numpy.empty((16, dimension), dtype=dtype)
+        self._unit = numpy.empty((16, dimension), dtype=dtype)
+        self._zero = numpy.empty(16, dtype=bool)
+        self._keys = []
+        self._rows = {}
+        self._next_key = itertools.count()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def __repr__(self):
+        return '{}[{}x{}]'.format(type(self).__name__, len(self), self.dimension)
+
+    def keys(self):
+        """Return the stored keys."""
+        return list(self._keys)
+
+    def get(self, key):
+        """Return the vector stored under key as a Vector."""
+        return Vector(self._data[self._rows[key]].copy())
+
+    def _grow(self, needed):
+        capacity = len(self._data)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ('_data', '_unit', '_zero'):
+            old = getattr(self, name)
+            new = numpy.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(self)] = old[:len(self)]
+            setattr(self, name, new)
+
+    def _fresh_key(self):
+        """Return the next counter value not already used as a key."""
+        key = next(self._next_key)
+        while key in self._rows:
+            key = next(self._next_key)
+        return key
+
+    def add(self, vector, key=None):
+        """Store vector under key, returning the key."""
+        return self.add_batch(vector, None if key is None else [key])[0]
+
+    def add_batch(self, vectors, keys=None):
+        """
+        Store every vector in vectors (a VectorBatch, 2-D array or iterable
+        of Vectors), returning their keys.
+        """
+        rows = _rows(vectors, self.dimension)
+        if rows.shape[1] != self.dimension:
+            raise NonConformantVectors(self.dimension, rows.shape[1])
+        if keys is None:
+            keys = [self._fresh_key() for _ in range(len(rows))]
+        elif len(keys) != len(rows):
+            raise ValueError('{} keys for {} vectors'.format(len(keys), len(rows)))
+        elif len(set(keys)) != len(keys):
+            raise KeyError('duplicate keys in {!r}'.format(keys))
+        for key in keys:
+            if key in self._rows:
+                raise KeyError('duplicate key {!r}'.format(key))
+
+        start = len(self)
+        end = start + len(rows)
+        self._grow(end)
+        mag = numpy.sqrt(numpy.einsum('ij,ij->i', rows, rows))
+        zero = numpy.isclose(mag, 0, util.EQUALITY_TOLERANCE)
+        self._data[start:end] = rows
+        self._unit[start:end] = rows / numpy.where(zero, 1, mag)[:, None]
+        self._zero[start:end] = zero
+        for (i, key) in enumerate(keys):
+            self._rows[key] = start + i
+        self._keys.extend(keys)
+        self._added(start, end)
+        return list(keys)
+
+    def remove(self, key):
+        """Remove the vector stored under key."""
+        row = self._rows.pop(key)
+        last = len(self) - 1
+        self._removed(row, key)
+        if row != last:
+            moved = self._keys[last]
+            for name in ('_data', '_unit', '_zero'):
+                arr = getattr(self, name)
+                arr[row] = arr[last]
+            self._keys[row] = moved
+            self._rows[moved] = row
+        self._keys.pop()
+
+    def _added(self, start, end):
+        """Hook called after rows start:end have been stored."""
+
+    def _removed(self, row, key):
+        """Hook called before row is removed."""
+
+    def _all_rows(self):
+        """Return every stored row."""
+        return numpy.arange(len(self))
+
+    def _candidates(self, unit):  # pylint: disable=unused-argument
+        """Return the rows to score for a query with the unit vector unit."""
+        return self._all_rows()
+
+    def query(self, vector, k=1, metric='angle'):
+        """
+        Return up to k (key, value) pairs for the stored vectors closest to
+        vector: the smallest angles in radians, or the largest dot products.
+        """
+        if metric not in METRICS:
+            raise ValueError('unknown metric {!r}'.format(metric))
+        if k < 1:
+            raise ValueError('k must be at least 1')
+        q = numpy.asarray(vector.v if isinstance(vector, Vector) else vector)
+        if len(q) != self.dimension:
+            raise NonConformantVectors(self.dimension, len(q))
+        mag = numpy.sqrt(numpy.dot(q, q))
+        if metric == 'angle' and numpy.isclose(mag, 0, util.EQUALITY_TOLERANCE):
+            raise ValueError('Cannot determine the angle between the zero vector and another vector.')
+        unit = q / mag if mag else q
+
+        rows = self._candidates(unit)
+        if metric == 'angle':
+            rows = rows[~self._zero[rows]]
+            scores = self._unit[rows] @ unit
+        else:
+            scores = self._data[rows] @ q
+        if len(rows) > k:
+            best = numpy.argpartition(-scores, k - 1)[:k]
+        else:
+            best = numpy.arange(len(rows))
+        best = best[numpy.argsort(-scores[best], kind='stable')]
+        values = scores[best]
+        if metric == 'angle':
+            values = util.arccos_clamped(values)
+        return [(self._keys[r], float(x)) for r, x in zip(rows[best], values)]
+
+
+class LSHIndex(ExactIndex):
+    """
+    An approximate index using random-hyperplane LSH. Each of the tables
+    hashes a vector to the signs of its dot products with bits random
+    hyperplanes; a query scores the stored vectors that share a bucket with
+    it in at least one table, probing buckets up to radius bit flips away.
+    Candidates are ranked exactly, so results are always correct vectors
+    but may miss some of the true nearest neighbours.
+
+    Recall rises with tables and radius and falls with bits; query cost
+    falls with bits.
+    """
+
+    def __init__(self, dimension, bits=12, tables=8, radius=1, seed=None,
+                 dtype=numpy.float64):
+        ExactIndex.__init__(self, dimension, dtype)
+        if not 0 < bits < 63:
+            raise ValueError('bits must be between 1 and 62')
+        self.bits = bits
+        self.radius = radius
+        rng = numpy.random.default_rng(seed)
+        self._planes = rng.standard_normal((tables, bits, dimension))
+        self._weights = 1 << numpy.arange(bits, dtype=numpy.int64)
+        self._buckets = [{} for _ in range(tables)]
+        self._codes = {}
+
+    def _hash(self, units):
+        """Return the (n, tables) bucket codes for rows of unit vectors."""
+        signs = numpy.einsum('nd,tbd->ntb', units, self._planes) > 0
+        return signs @ self._weights
+
+    def _added(self, start, end):
+        codes = self._hash(self._unit[start:end])
+        for (key, row_codes) in zip(self._keys[start:end], codes.tolist()):
+            self._codes[key] = row_codes
+            for (table, code) in zip(self._buckets, row_codes):
+                table.setdefault(code, set()).add(key)
+
+    def _removed(self, row, key):
+        for (table, code) in zip(self._buckets, self._codes.pop(key)):
+            bucket = table[code]
+            bucket.discard(key)
+            if not bucket:
+                del table[code]
+
+    def _probes(self, code):
+        yield code
+        for r in range(1, self.radius + 1):
+            for flips in itertools.combinations(range(self.bits), r):
+                probe = code
+                for b in flips:
+                    probe ^= 1 << b
+                yield probe
+
+    def _candidates(self, unit):
+        keys = set()
+        codes = self._hash(unit.reshape(1, -1))[0].tolist()
+        for (table, code) in zip(self._buckets, codes):
+            for probe in self._probes(code):
+                bucket = table.get(probe)
+                if bucket:
+                    keys.update(bucket)
+        return numpy.fromiter((self._rows[k] for k in keys), dtype=numpy.intp,
+                              count=len(keys))
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+``linea.instrument``
+
+Opt-in call counting and timing for :py:mod:`linea.vector`.
+
+Switching instrumentation on with :py:func:`set_instrumentation` replaces
+the public functions of linea.vector and the methods of Vector and its
+subclasses with wrappers that record, for each of them, the number of
+calls, the total time spent, the bytes they allocate and a histogram of
+the dimensions they are called on. Switching it off removes
+the wrappers again, leaving any that linea.memo installed meanwhile, so
+when it is off there is nothing left to cost anything. :py:func:`profiled` instruments just the enclosed block::
+
+    with profiled() as profile:
+        run_workload()
+    print(profile.report())
+
+Times and bytes are inclusive: angle's include the dot and magnitude
+calls it makes, which are also counted under their own names. A call's
+bytes are the peak memory it allocated, temporaries included, above what
+was in use when it was called, traced with tracemalloc as bench.measure
+does. Tracing runs while instrumentation is on, slowing every allocation;
+it is process-wide, so allocations by other threads running at the same
+time are counted too. Modules that imported a function
+by name (``from linea.vector import dot``) before instrumentation was
+switched on keep calling the original.
+
+Components:
+
++ class Profile
++ function: set_instrumentation
++ function: snapshot
++ function: reset
++ function: profiled
+"""
+import collections
+import contextlib
+import functools
+import threading
+import time
+import tracemalloc
+
+from . import vector
+
+FUNCTIONS = ('dot', 'angle', 'parallel', 'orthogonal', 'relate', 'cross',
+             'area_parallelogram', 'area_triangle')
+METHODS = ('magnitude', 'is_zero', 'unit', 'dot', 'angle_with', 'parallel_to',
+           'orthogonal_to', 'project_parallel', 'project_orthogonal', 'freeze',
+           '__add__', '__sub__', '__mul__', '__iadd__', '__isub__', '__imul__')
+CLASSES = (vector.Vector, vector.FrozenVector, vector._SmallVector,
+           vector.Vec2, vector.Vec3, vector.SparseVector)
+
+_lock = threading.Lock()
+_stats = {}
+_enabled = False
+# Whether set_instrumentation started tracemalloc, and so should stop it.
+_tracing = False
+# Per thread, the peak traced memory of each instrumented call in progress,
+# as seen by the calls nested in it: each call resets the peak.
+_peaks = threading.local()
+# Identifies instrument's wrappers to vector._unpatch.
+_TOKEN = object()
+
+
+class _Entry:
+    __slots__ = ('calls', 'time', 'bytes', 'dimensions')
+
+    def __init__(self):
+        self.calls = 0
+        self.time = 0
+        self.bytes = 0
+        self.dimensions = collections.Counter()
+
+
+def _wrap(name, fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        stack = getattr(_peaks, 'stack', None)
+        if stack is None:
+            stack = _peaks.stack = []
+        (base, peak) = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1] = max(stack[-1], peak)
+        tracemalloc.reset_peak()
+        stack.append(0)
+        start = time.perf_counter_ns()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            peak = max(tracemalloc.get_traced_memory()[1], stack.pop())
+            if stack:
+                stack[-1] = max(stack[-1], peak)
+        try:
+            dimension = len(args[0])
+        except TypeError:
+            dimension = None
+        with _lock:
+            entry = _stats.get(name)
+            if entry is None:
+                entry = _stats[name] = _Entry()
+            entry.calls += 1
+            entry.time += elapsed
+            entry.bytes += max(0, peak - base)
+            entry.dimensions[dimension] += 1
+        return result
+    return wrapper
+
+
+def _install():
+    for name in FUNCTIONS:
+        vector._patch(vector, name, _TOKEN, functools.partial(_wrap, name))
+    for cls in CLASSES:
+        for name in METHODS:
+            if name in cls.__dict__:
+                vector._patch(cls, name, _TOKEN,
+                              functools.partial(_wrap, cls.__name__ + '.' + name))
+
+
+def set_instrumentation(enabled):
+    """
+    Turn instrumentation of linea.vector on or off, returning the previous
+    setting. The recorded statistics are kept until reset.
+    """
+    global _enabled, _tracing  # pylint: disable=W0603
+    with _lock:
+        previous = _enabled
+        _enabled = bool(enabled)
+    if enabled and not previous:
+        _tracing = not tracemalloc.is_tracing()
+        if _tracing:
+            tracemalloc.start()
+        _install()
+    elif previous and not enabled:
+        vector._unpatch(_TOKEN)
+        if _tracing:
+            tracemalloc.stop()
+            _tracing = False
+    return previous
+
+
+def snapshot():
+    """
+    Return the statistics recorded so far as a dict mapping each function
+    or method name (e.g. 'dot', 'Vector.unit') to a dict of its calls, its
+    total time in seconds, the bytes it allocated and a dict counting the
+    dimensions it was called on.
+    """
+    with _lock:
+        return {name: {'calls': e.calls,
+                       'time': e.time / 1e9,
+                       'bytes': e.bytes,
+                       'dimensions': dict(e.dimensions)}
+                for (name, e) in _stats.items()}
+
+
+def reset():
+    """Discard the statistics recorded so far."""
+    with _lock:
+        _stats.clear()
+
+
+class Profile:
+    """
+    The statistics recorded during a profiled block, in the form snapshot
+    returns; index it by function or method name.
+    """
+
+    def __init__(self, stats=None):
+        self.stats = stats or {}
+
+    def __getitem__(self, name):
+        return self.stats[name]
+
+    def __contains__(self, name):
+        return name in self.stats
+
+    def __iter__(self):
+        return iter(self.stats)
+
+    def __len__(self):
+        return len(self.stats)
+
+    def report(self):
+        """Return a table of the statistics, the slowest functions first."""
+        lines = ['{:<28} {:>10} {:>12} {:>12}  {}'.format(
+            'function', 'calls', 'time (ms)', 'bytes', 'dimensions')]
+        for (name, s) in sorted(self.stats.items(), key=lambda i: -i[1]['time']):
+            dimensions = ', '.join('{}: {}'.format(d, n) for (d, n) in
+                                   sorted(s['dimensions'].items(),
+                                          key=lambda i: -i[1]))
+            lines.append('{:<28} {:>10} {:>12.3f} {:>12}  {}'.format(
+                name, s['calls'], s['time'] * 1e3, s['bytes'], dimensions))
+        return '\n'.join(lines)
+
+
+def _difference(after, before):
+    stats = {}
+    for (name, a) in after.items():
+        b = before.get(name)
+        if b is None:
+            stats[name] = a
+            continue
+        if a['calls'] == b['calls']:
+            continue
+        dimensions = collections.Counter(a['dimensions'])
+        dimensions.subtract(b['dimensions'])
+        stats[name] = {'calls': a['calls'] - b['calls'],
+                       'time': a['time'] - b['time'],
+                       'bytes': a['bytes'] - b['bytes'],
+                       'dimensions': {d: n for (d, n) in dimensions.items() if n}}
+    return stats
+
+
+@contextlib.contextmanager
+def profiled():
+    """
+    Instrument the enclosed block and yield a Profile that holds the calls
+    made in it once the block exits. Calls made by other threads while the
+    block runs are included.
+    """
+    profile = Profile()
+    before = snapshot()
+    previous = set_instrumentation(True)
+    try:
+        yield profile
+    finally:
+        set_instrumentation(previous)
+        profile.stats = _difference(snapshot(), before)
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+``linea.lazy``
+
+Lazily evaluated Vector arithmetic.
+
+In lazy mode, switched on with :py:func:`set_lazy` or the
+:py:func:`enabled` context manager, adding, subtracting and scaling
+Vectors builds an expression instead of computing arrays; outside it,
+wrapping a single vector with :py:func:`defer` does the same for the
+arithmetic it takes part in. The expression is only evaluated when its
+array is needed, for example when it is printed, indexed, compared with
+``==`` or passed to dot or magnitude. Since addition, subtraction and
+scaling are the only arithmetic on a Vector, any expression is a linear
+combination of vectors, and it is kept flattened as one: ``a*v + b*w -
+c*u`` is the three terms (a, v), (b, w) and (-c, u).
+
+Evaluation writes the result block by block, summing every term over a
+block while it is still in cache, so each input is read from memory once
+and the only allocations are the result and one block-sized scratch
+array, where eager evaluation allocates a temporary per operator.
+
+>>> from linea.vector import Vector
+>>> with enabled():
+...     e = 2 * Vector(1, 2) + Vector(3, 4) - 0.5 * Vector(2, 2)
+>>> e.terms is not None
+True
+>>> print(e)
+[4.0; 7.0]
+
+The operands are read when the expression is evaluated, not when it is
+built, so changing one in place in between changes the result.
+
+Components:
+
++ class LazyVector
++ function: defer
++ function: set_lazy
++ function: enabled
+"""
+import contextlib
+import numbers
+
+import numpy
+
+from . import vector
+from .vector import NonConformantVectors, Vector
+
+# The number of elements evaluated at a time; a block of every operand
+# should fit in cache together.
+BLOCK = 4096
+
+
+class LazyVector(Vector):
+    """
+    A Vector whose value is a linear combination of other vectors,
+    computed the first time its array is used and then cached.
+    """
+    __slots__ = ('terms', '_size', '_value')
+
+    def __init__(self, terms, size):
+        """
+        Initialise an expression from a list of (coefficient, Vector) terms
+        of dimension size. Use defer rather than calling this directly.
+        """
+        # Vector.__init__ is bypassed: it would assign v, and the setter
+        # below would then discard the terms.
+        # pylint: disable=W0231
+        self.terms = terms
+        self._size = size
+        self._value = None
+
+    @property
+    def v(self):
+        """The evaluated array."""
+        if self._value is None:
+            self._value = _evaluate(self.terms, self._size)
+            self.terms = None
+        return self._value
+
+    @v.setter
+    def v(self, value):
+        self._value = value
+        self.terms = None
+
+    def __len__(self):
+        return self._size
+
+    def __repr__(self):
+        return 'LazyVector[{}]'.format(self._size)
+
+    def evaluate(self):
+        """Return the value of the expression as a plain Vector."""
+        return Vector(self.v)
+
+    def __reduce_ex__(self, protocol):
+        return self.evaluate().__reduce_ex__(protocol)
+
+    def _combine(self, other, sign):
+        if len(other) != self._size:
+            raise NonConformantVectors(self._size, len(other))
+        return LazyVector(_merge(_terms(self), _terms(other), sign), self._size)
+
+    def __add__(self, other):
+        return self._combine(other, 1)
+
+    def __radd__(self, other):
+        return self._combine(other, 1)
+
+    def __sub__(self, other):
+        return self._combine(other, -1)
+
+    def __rsub__(self, other):
+        if len(other) != self._size:
+            raise NonConformantVectors(self._size, len(other))
+        return LazyVector(_merge(_terms(other), _terms(self), -1), self._size)
+
+    def __mul__(self, other):
+        if not isinstance(other, numbers.Number):
+            return Vector(self.v * other)
+        return LazyVector([(c * other, v) for (c, v) in _terms(self)], self._size)
+
+    def __rmul__(self, other):
+        return self * other
+
+    def __neg__(self):
+        return self * -1
+
+    # Augmented assignment rebinds to a new expression rather than
+    # evaluating; see Vector for the eager, in-place versions.
+    def __iadd__(self, other):
+        return self + other
+
+    def __isub__(self, other):
+        return self - other
+
+    def __imul__(self, other):
+        return self * other
+
+
+def defer(v):
+    """
+    Return the Vector v as a LazyVector, so that arithmetic on it is
+    deferred and fused.
+    """
+    if isinstance(v, LazyVector):
+        return v
+    return LazyVector([(1, v)], len(v))
+
+
+def set_lazy(on):
+    """
+    Turn lazy mode on or off for all Vector arithmetic, returning the
+    previous setting.
+    """
+    previous = vector._defer is not None
+    vector._defer = defer if on else None
+    return previous
+
+
+@contextlib.contextmanager
+def enabled():
+    """Run the enclosed block in lazy mode."""
+    previous = set_lazy(True)
+    try:
+        yield
+    finally:
+        set_lazy(previous)
+
+
+def _terms(v):
+    """Return the (coefficient, Vector) terms of v."""
+    if isinstance(v, LazyVector) and v.terms is not None:
+        return v.terms
+    return [(1, v)]
+
+
+def _merge(left, right, sign):
+    """
+    Return the terms of left + sign * right, combining the coefficients of
+    terms that refer to the same vector.
+    """
+    terms = list(left)
+    position = {id(v): i for (i, (_, v)) in enumerate(terms)}
+    for (c, v) in right:
+        i = position.get(id(v))
+        if i is None:
+            position[id(v)] = len(terms)
+            terms.append((sign * c, v))
+        else:
+            terms[i] = (terms[i][0] + sign * c, v)
+    return terms
+
+
+def _evaluate(terms, size):
+    arrays = [numpy.asarray(v.v) for (_, v) in terms]
+    coeffs = [c for (c, _) in terms]
+    dtype = numpy.result_type(*(arrays + coeffs))
+    out = numpy.empty(size, dtype=dtype)
+    scratch = numpy.empty(min(size, BLOCK), dtype=dtype)
+    for start in range(0, size, BLOCK):
+        stop = min(start + BLOCK, size)
+        o = out[start:stop]
+        t = scratch[:stop - start]
+        numpy.multiply(arrays[0][start:stop], coeffs[0], out=o)
+        for (c, a) in zip(coeffs[1:], arrays[1:]):
+            block = a[start:stop]
+            if c == 1:
+                numpy.add(o, block, out=o)
+            elif c == -1:
+                numpy.subtract(o, block, out=o)
+            else:
+                numpy.multiply(block, c, out=t)
+                numpy.add(o, t, out=o)
+    return out
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+``linea.memo``
+
+Opt-in memoisation of vector queries, keyed on the contents of the
+vectors rather than their identity.
+
+:py:func:`memoize` wraps a function or method so that a call with vectors
+whose contents (and types) match an earlier call returns the earlier
+result. :py:func:`memoized` does the same, for the duration of a block,
+to functions and methods of :py:mod:`linea.vector` (by default angle,
+Vector.project_parallel and Vector.unit)::
+
+    with memoized(maxsize=10000) as cache:
+        run_workload()
+    print(cache.stats())
+
+Results are kept in a :py:class:`Cache`, which evicts the least recently
+used entries to stay within a number of entries and, optionally, of bytes
+of cached arrays. It is safe to share between threads, as is a memoised
+function; two threads missing on the same key at once both compute it.
+
+A vector's key is its type, dimension and a 128-bit BLAKE2 digest of its
+bytes. Digesting a Vector is far slower than a dot product over it, so
+memoising angle or unit on mutable Vectors, which must be digested on
+every call, costs more than it saves; freeze the vectors that are queried
+repeatedly, as a FrozenVector's digest is computed once and kept. The
+arrays of cached results are made read-only, since every later hit returns
+the same object; calls given an out argument are not cached.
+
+Components:
+
++ class Cache
++ function: fingerprint
++ function: memoize
++ function: memoized
+"""
+import collections
+import contextlib
+import functools
+import hashlib
+import threading
+
+import numpy
+
+from . import vector
+from .vector import FrozenVector, Relation, SparseVector, Vector, _SmallVector
+
+MAXSIZE = 4096
+
+
+class Cache:
+    """
+    A thread-safe LRU cache of at most maxsize entries and, if maxbytes is
+    given, at most maxbytes bytes of cached arrays.
+    """
+
+    def __init__(self, maxsize=MAXSIZE, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return 'Cache[{}/{}]'.format(len(self), self.maxsize)
+
+    def lookup(self, key):
+        """Return (True, value) if key is cached, or (False, None)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def store(self, key, value, nbytes=0):
+        """Cache value under key, evicting old entries to make room."""
+        if self.maxbytes is not None and nbytes > self.maxbytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, nbytes)
+            self._bytes += nbytes
+            while (len(self._entries) > self.maxsize or
+                   (self.maxbytes is not None and self._bytes > self.maxbytes)):
+                (_, (_, evicted)) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        """Discard every entry and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Return the hits, misses, evictions, hit rate, number of entries and
+        bytes cached, and the limits.
+        """
+        with self._lock:
+            calls = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'hit_rate': self.hits / calls if calls else 0.0,
+                    'size': len(self._entries),
+                    'bytes': self._bytes,
+                    'maxsize': self.maxsize,
+                    'maxbytes': self.maxbytes}
+
+
+def _digest(*arrays):
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        a = numpy.ascontiguousarray(a)
+        h.update(a.dtype.str.encode('ascii'))
+        h.update(memoryview(a.reshape(-1).view(numpy.uint8)))
+    return h.digest()
+
+
+def fingerprint(v):
+    """
+    Return a hashable key identifying the type and exact contents of the
+    vector v.
+    """
+    if isinstance(v, _SmallVector):
+        return (type(v), v.astuple())
+    if isinstance(v, FrozenVector):
+        if v._digest is None:
+            v._digest = _digest(v.v)
+        return (type(v), len(v), v._digest)
+    if isinstance(v, SparseVector):
+        return (type(v), len(v), _digest(v.indices, v.values))
+    return (type(v), len(v), _digest(v.v))
+
+
+def _key(name, args, kwargs):
+    """Return the cache key of a call, or None if it cannot be cached."""
+    parts = [name]
+    for a in args:
+        parts.append(fingerprint(a) if isinstance(a, Vector) else a)
+    for (k, a) in sorted(kwargs.items()):
+        parts.append((k, fingerprint(a) if isinstance(a, Vector) else a))
+    key = tuple(parts)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _frozen_copy(v):
+    """Return a copy of the operand v that later changes to v cannot reach."""
+    if isinstance(v, SparseVector):
+        return SparseVector(len(v), v.indices, v.values)
+    if isinstance(v, _SmallVector):
+        return type(v)(*v.astuple())
+    return v.freeze()
+
+
+def _freeze(value):
+    """Make the arrays of a result read-only; return its size in bytes."""
+    if isinstance(value, Relation):
+        # A Relation keeps its operands to project with, and they belong
+        # to the first caller.
+        value.v = _frozen_copy(value.v)
+        value.w = _frozen_copy(value.w)
+        return _freeze(value.v) + _freeze(value.w) + 24
+    if isinstance(value, SparseVector):
+        # Results such as unit share their indices with the input; freeze
+        # a copy so that the caller's input stays writeable.
+        value.indices = value.indices.copy()
+        value.indices.flags.writeable = False
+        value.values.flags.writeable = False
+        return value.indices.nbytes + value.values.nbytes
+    if isinstance(value, _SmallVector):
+        return 8 * len(value)
+    if isinstance(value, Vector):
+        value.v.flags.writeable = False
+        return value.v.nbytes
+    return numpy.asarray(value).nbytes
+
+
+def _copy(value):
+    # Small vectors keep their components in slots and cannot be made
+    # read-only, so every hit gets its own copy.
+    if isinstance(value, _SmallVector):
+        return type(value)(*value.astuple())
+    if isinstance(value, Relation) and (isinstance(value.v, _SmallVector) or
+                                        isinstance(value.w, _SmallVector)):
+        return Relation(_copy(value.v), _copy(value.w), value.dot, value.v_magnitude,
+                        value.w_magnitude, value.tolerance)
+    return value
+
+
+def memoize(fn=None, cache=None, maxsize=MAXSIZE, maxbytes=None):
+    """
+    Memoise fn, usable as @memoize or @memoize(maxsize=...). The wrapper
+    keeps its Cache, a new one unless cache is given, as wrapper.cache.
+    Calls with arguments that are neither Vectors nor hashable, or with an
+    out argument, are passed straight through.
+    """
+    if fn is None:
+        return functools.partial(memoize, cache=cache, maxsize=maxsize,
+                                 maxbytes=maxbytes)
+    if cache is None:
+        cache = Cache(maxsize, maxbytes)
+    name = fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = None if kwargs.get('out') is not None else _key(name, args, kwargs)
+        if key is None:
+            return fn(*args, **kwargs)
+        (found, value) = cache.lookup(key)
+        if found:
+            return _copy(value)
+        value = fn(*args, **kwargs)
+        cache.store(key, value, _freeze(value))
+        return _copy(value)
+    wrapper.cache = cache
+    return wrapper
+
+
+FUNCTIONS = ('dot', 'angle', 'parallel', 'orthogonal', 'relate', 'cross')
+METHODS = ('unit', 'angle_with', 'project_parallel', 'project_orthogonal')
+CLASSES = (Vector, FrozenVector, SparseVector)
+
+
+@contextlib.contextmanager
+def memoized(names=('angle', 'project_parallel', 'unit'), maxsize=MAXSIZE,
+             maxbytes=None, cache=None):
+    """
+    Memoise the linea.vector functions and Vector methods in names (from
+    FUNCTIONS and METHODS) for the enclosed block, sharing one Cache (a new
+    one unless cache is given), which is yielded. They are replaced
+    module-wide, so calls from other threads during the block are memoised
+    too. On exit only this block's wrappers are removed, whatever else
+    (such as linea.instrument) has wrapped the functions meanwhile.
+    """
+    for name in names:
+        if name not in FUNCTIONS and name not in METHODS:
+            raise ValueError('cannot memoise {!r}'.format(name))
+    if cache is None:
+        cache = Cache(maxsize, maxbytes)
+    wrap = functools.partial(memoize, cache=cache)
+    token = object()
+    try:
+        for name in names:
+            if name in FUNCTIONS:
+                vector._patch(vector, name, token, wrap)
+                continue
+            for cls in CLASSES:
+                if name in cls.__dict__:
+                    vector._patch(cls, name, token, wrap)
+        yield cache
+    finally:
+        vector._unpatch(token)
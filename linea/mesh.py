@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+``linea.mesh``
+
+Chunked, vectorised cross products and areas for large numbers of 3D
+vectors and triangles.
+
+The edge functions take two N x 3 arrays (or VectorBatches), v and w, and
+compute the per-row result of the :py:mod:`linea.vector` function of the
+same name. The mesh functions take a V x 3 vertex array and an M x 3
+integer array of triangles, each row the indices of its three corners.
+Rows are processed chunk_size at a time, so the temporaries are bounded by
+the chunk however many rows there are; :py:func:`surface_area` keeps only
+a running total, so it needs no per-triangle array at all.
+
+>>> vertices = [[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]]
+>>> triangles = [[0, 1, 2], [0, 1, 3]]
+>>> triangle_areas(vertices, triangles)
+array([0.5, 0.5])
+>>> print(surface_area(vertices, triangles))
+1.0
+
+Components:
+
++ function: cross
++ function: area_parallelogram
++ function: area_triangle
++ function: triangle_areas
++ function: surface_area
+"""
+import numpy
+
+from .batch import VectorBatch, _cross
+from .vector import NonConformantVectors
+
+# Rows handled at a time: about 1.5 MiB per N x 3 float64 temporary.
+CHUNK_SIZE = 65536
+
+
+def _rows(a):
+    """Return a as an N x 3 ndarray, checking the dimension."""
+    a = a.v if isinstance(a, VectorBatch) else numpy.asarray(a)
+    if a.ndim != 2:
+        raise ValueError('expected an N x 3 array')
+    if a.shape[1] != 3:
+        raise NonConformantVectors(3, a.shape[1])
+    return a
+
+
+def _edges(v, w):
+    v = _rows(v)
+    w = _rows(w)
+    if len(v) != len(w):
+        raise ValueError('v and w hold {} and {} vectors'.format(len(v), len(w)))
+    return (v, w)
+
+
+def _chunks(count, chunk_size):
+    chunk_size = chunk_size or CHUNK_SIZE
+    return ((start, min(start + chunk_size, count))
+            for start in range(0, count, chunk_size))
+
+
+def _norms(c, out):
+    numpy.sqrt(numpy.einsum('ij,ij->i', c, c), out=out)
+
+
+def cross(v, w, out=None, chunk_size=None):
+    """
+    Return the N x 3 row-wise cross products of v and w, written into out
+    if it is given.
+    """
+    (v, w) = _edges(v, w)
+    if out is None:
+        out = numpy.empty(v.shape, dtype=numpy.result_type(v, w, float))
+    for (start, stop) in _chunks(len(v), chunk_size):
+        _cross(v[start:stop], w[start:stop], out[start:stop])
+    return out
+
+
+def area_parallelogram(v, w, out=None, chunk_size=None):
+    """
+    Return the areas of the N parallelograms formed by the rows of v and w,
+    written into out if it is given.
+    """
+    (v, w) = _edges(v, w)
+    if out is None:
+        out = numpy.empty(len(v), dtype=numpy.result_type(v, w, float))
+    scratch = numpy.empty((min(len(v), chunk_size or CHUNK_SIZE), 3), out.dtype)
+    for (start, stop) in _chunks(len(v), chunk_size):
+        c = scratch[:stop - start]
+        _cross(v[start:stop], w[start:stop], c)
+        _norms(c, out[start:stop])
+    return out
+
+
+def area_triangle(v, w, out=None, chunk_size=None):
+    """
+    Return the areas of the N triangles formed by the rows of v and w,
+    written into out if it is given.
+    """
+    out = area_parallelogram(v, w, out, chunk_size)
+    out *= 0.5
+    return out
+
+
+def _triangles(vertices, triangles, chunk_size):
+    """Yield the doubled area of every triangle, a chunk at a time."""
+    vertices = _rows(vertices)
+    triangles = numpy.asarray(triangles)
+    if triangles.ndim != 2 or triangles.shape[1] != 3:
+        raise ValueError('triangles must be an M x 3 array of vertex indices')
+    dtype = numpy.result_type(vertices, float)
+    scratch = numpy.empty((min(len(triangles), chunk_size or CHUNK_SIZE), 3), dtype)
+    for (start, stop) in _chunks(len(triangles), chunk_size):
+        corners = triangles[start:stop]
+        p = vertices[corners[:, 0]]
+        c = scratch[:stop - start]
+        _cross(vertices[corners[:, 1]] - p, vertices[corners[:, 2]] - p, c)
+        norms = numpy.empty(stop - start, dtype)
+        _norms(c, norms)
+        yield (start, stop, norms)
+
+
+def triangle_areas(vertices, triangles, out=None, chunk_size=None):
+    """
+    Return the area of each of the M triangles, written into out if it is
+    given.
+    """
+    if out is None:
+        out = numpy.empty(len(triangles),
+                          dtype=numpy.result_type(numpy.asarray(vertices), float))
+    for (start, stop, norms) in _triangles(vertices, triangles, chunk_size):
+        numpy.multiply(norms, 0.5, out=out[start:stop])
+    return out
+
+
+def surface_area(vertices, triangles, chunk_size=None):
+    """Return the total area of the triangles."""
+    total = 0.0
+    for (_, _, norms) in _triangles(vertices, triangles, chunk_size):
+        total += float(norms.sum())
+    return 0.5 * total
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+``linea.pairwise``
+
+All-pairs dot products, cosines and angles between two sets of vectors,
+computed tile by tile with blocked matrix multiplies.
+
+A tile is a block of the N x M result; its size is chosen so that one
+tile fits in a memory budget (in bytes), which means very large sets can
+be streamed through :py:func:`tiles` or reduced to the matching pairs with
+:py:func:`pairs` without the whole matrix ever being held in memory. The
+normalised copies of the inputs needed for the cosine and angle metrics
+are not counted against the budget.
+
+Components:
+
++ function: tiles
++ function: pairwise
++ function: pairs
+"""
+import math
+import numpy
+
+from . import util
+from .batch import VectorBatch
+from .vector import NonConformantVectors
+
+METRICS = ('dot', 'cosine', 'angle')
+RELATIONS = ('parallel', 'orthogonal')
+
+# Default memory budget for a single result tile: 64 MiB.
+MEMORY = 64 * 1024 * 1024
+
+
+def _as_batch(vectors):
+    if isinstance(vectors, VectorBatch):
+        return vectors
+    return VectorBatch(vectors)
+
+
+def _tile_shape(n, m, memory, itemsize=8):
+    """Return the (rows, cols) of a tile of an n x m result within memory."""
+    cells = max(1, memory // itemsize)
+    rows = min(n, max(1, int(math.sqrt(cells))))
+    cols = min(m, max(1, cells // rows))
+    return rows, cols
+
+
+def _normalise(batch, strict):
+    """
+    Return the rows of batch scaled to unit length and a mask of its zero
+    rows. If strict, zero rows raise a ValueError as Vector.unit does.
+    """
+    mag = batch.magnitude()
+    zero = numpy.isclose(mag, 0, util.EQUALITY_TOLERANCE)
+    if strict and zero.any():
+        raise ValueError("cannot normalise the zero vector")
+    return batch.v / numpy.where(zero, 1, mag)[:, None], zero
+
+
+def _operands(a, b):
+    a = _as_batch(a)
+    b = a if b is None else _as_batch(b)
+    if a.dimension != b.dimension:
+        raise NonConformantVectors(a.dimension, b.dimension)
+    return a, b
+
+
+def _blocks(left, right, memory):
+    """Yield (row, col, left rows @ right rows transposed) tile by tile."""
+    rows, cols = _tile_shape(len(left), len(right), memory)
+    for i in range(0, len(left), rows):
+        for j in range(0, len(right), cols):
+            yield i, j, left[i:i + rows] @ right[j:j + cols].T
+
+
+def tiles(a, b=None, metric='dot', memory=MEMORY,
+          tolerance=util.EQUALITY_TOLERANCE):
+    """
+    Yield (row, col, block) for every tile of the metric between the
+    vectors of a and b (or a with itself if b is None). block holds the
+    results for a[row:row + block.shape[0]] against b[col:col + block.shape[1]].
+
+    a and b may be VectorBatches, two-dimensional arrays or iterables of
+    Vectors. The cosine and angle metrics raise a ValueError if either set
+    contains a zero vector, as angle does.
+    """
+    if metric not in METRICS:
+        raise ValueError('unknown metric {!r}'.format(metric))
+    a, b = _operands(a, b)
+    if metric == 'dot':
+        left, right = a.v, b.v
+    else:
+        left = _normalise(a, True)[0]
+        right = left if b is a else _normalise(b, True)[0]
+    for i, j, block in _blocks(left, right, memory):
+        if metric == 'angle':
+            block = util.arccos_clamped(block, tolerance)
+        yield i, j, block
+
+
+def pairwise(a, b=None, metric='dot', memory=MEMORY, out=None,
+             tolerance=util.EQUALITY_TOLERANCE):
+    """
+    Return the full matrix of metric ('dot', 'cosine' or 'angle', in
+    radians) between the vectors of a and b. out may be a preallocated
+    array, such as a numpy.memmap, that the tiles are written into.
+
+    >>> print(pairwise([[1, 0], [0, 2]], metric='dot'))
+    [[1 0]
+     [0 4]]
+    """
+    a, b = _operands(a, b)
+    if out is None:
+        dtype = a.v.dtype if metric == 'dot' else float
+        out = numpy.empty((len(a), len(b)), dtype=numpy.result_type(dtype, b.v))
+    elif out.shape != (len(a), len(b)):
+        raise ValueError('out has shape {}, expected {}'.format(
+            out.shape, (len(a), len(b))))
+    for i, j, block in tiles(a, b, metric, memory, tolerance):
+        out[i:i + block.shape[0], j:j + block.shape[1]] = block
+    return out
+
+
+def pairs(a, b=None, relation='parallel', metric='angle', memory=MEMORY,
+          tolerance=util.EQUALITY_TOLERANCE):
+    """
+    Return (rows, cols) index arrays of the pairs of a and b that satisfy
+    relation, streaming the tiles so only the matches are kept.
+
+    relation may be 'parallel' or 'orthogonal', which follow the tolerance
+    rules (including zero vectors) of vector.parallel and
+    vector.orthogonal, or a callable taking a tile of metric values and
+    returning a boolean mask of the pairs to keep.
+    """
+    a, b = _operands(a, b)
+    if callable(relation):
+        chunks = ((i, j, relation(block))
+                  for i, j, block in tiles(a, b, metric, memory, tolerance))
+    elif relation in RELATIONS:
+        chunks = _relation_tiles(a, b, relation, memory, tolerance)
+    else:
+        raise ValueError('unknown relation {!r}'.format(relation))
+
+    rows, cols = [], []
+    for i, j, mask in chunks:
+        r, c = numpy.nonzero(mask)
+        rows.append(r + i)
+        cols.append(c + j)
+    if not rows:
+        return numpy.empty(0, dtype=int), numpy.empty(0, dtype=int)
+    return numpy.concatenate(rows), numpy.concatenate(cols)
+
+
+def _relation_tiles(a, b, relation, memory, tolerance):
+    """Yield (row, col, mask) tiles for the parallel or orthogonal relation."""
+    mag_a = a.magnitude()
+    mag_b = mag_a if b is a else b.magnitude()
+    zero_a = numpy.isclose(mag_a, 0, util.EQUALITY_TOLERANCE)
+    zero_b = zero_a if b is a else numpy.isclose(mag_b, 0, util.EQUALITY_TOLERANCE)
+    mag_a = numpy.where(zero_a, 1, mag_a)
+    mag_b = numpy.where(zero_b, 1, mag_b)
+    for i, j, block in _blocks(a.v, b.v, memory):
+        rows = slice(i, i + block.shape[0])
+        cols = slice(j, j + block.shape[1])
+        zero = zero_a[rows, None] | zero_b[None, cols]
+        if relation == 'orthogonal':
+            mask = numpy.isclose(block, 0, tolerance)
+        else:
+            # the cosine and angle as vector.angle forms them, so that
+            # the tests agree with vector.parallel
+            cosine = block / numpy.outer(mag_a[rows], mag_b[cols])
+            cosine[zero] = 0
+            theta = util.arccos_clamped(cosine, tolerance)
+            mask = (numpy.isclose(theta, 0, tolerance) |
+                    numpy.isclose(theta, math.pi, tolerance))
+        yield i, j, mask | zero
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+``linea.parallel``
+
+Multi-core execution of batched :py:mod:`linea.batch` operations.
+
+The input and output arrays live in shared memory, so worker processes
+read their rows and write their results in place: only the operation, its
+arguments (such as a basis Vector) and the chunk bounds are sent to the
+workers. Allocating the input with :py:class:`SharedArray` (and passing one
+as out) avoids copying the data at all; plain batches and arrays are
+copied into shared memory once.
+
+Chunk boundaries depend only on the number of rows and chunk_size, never
+on the number of workers, and each chunk runs the same code as a
+single-process call would, so the results are bit-identical whatever
+workers is.
+
+>>> from linea.vector import Vector
+>>> map_batch('dot', [[1, 2], [3, 4]], Vector(1, 1), workers=1)
+array([3, 7])
+
+Components:
+
++ class SharedArray
++ class Executor
++ function: chunks
++ function: map_batch
+"""
+import concurrent.futures
+import os
+from multiprocessing import shared_memory
+
+import numpy
+
+from .batch import VectorBatch
+
+# Target size of the input rows handled by one task: 4 MiB.
+CHUNK_BYTES = 4 * 1024 * 1024
+
+
+class SharedArray:
+    """
+    An ndarray backed by a named shared memory block. The process that
+    creates it owns the block and unlinks it on close(); other processes
+    attach to it by name.
+    """
+
+    def __init__(self, shape, dtype=numpy.float64, name=None):
+        self.shape = tuple(shape)
+        self.dtype = numpy.dtype(dtype)
+        size = max(1, int(numpy.prod(self.shape)) * self.dtype.itemsize)
+        self.owner = name is None
+        self._shm = shared_memory.SharedMemory(name=name, create=self.owner,
+                                               size=size if self.owner else 0)
+        self.array = numpy.ndarray(self.shape, dtype=self.dtype,
+                                   buffer=self._shm.buf)
+
+    @classmethod
+    def from_array(cls, a):
+        """Return a new SharedArray holding a copy of a."""
+        a = numpy.asarray(a)
+        shared = cls(a.shape, a.dtype)
+        shared.array[...] = a
+        return shared
+
+    @property
+    def name(self):
+        """The name other processes use to attach to the block."""
+        return self._shm.name
+
+    def spec(self):
+        """Return the picklable (name, shape, dtype) used to attach."""
+        return (self.name, self.shape, self.dtype.str)
+
+    def batch(self):
+        """Return a VectorBatch viewing the shared rows."""
+        return VectorBatch(self.array)
+
+    def close(self):
+        """Release this process's mapping, unlinking the block if owned."""
+        if self._shm is None:
+            return
+        self.array = None
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return 'SharedArray[{}, {}]'.format(self.shape, self.dtype)
+
+
+def _apply(op, batch, args):
+    """Run op (a VectorBatch method name or a callable) on batch."""
+    if callable(op):
+        result = op(batch, *args)
+    else:
+        result = getattr(batch, op)(*args)
+    if isinstance(result, VectorBatch):
+        result = result.v
+    return numpy.asarray(result)
+
+
+def _run_chunk(op, args, source, dest, start, stop):
+    """Worker entry point: compute rows start:stop of dest from source."""
+    src = SharedArray(source[1], source[2], name=source[0])
+    dst = SharedArray(dest[1], dest[2], name=dest[0])
+    try:
+        dst.array[start:stop] = _apply(op, VectorBatch(src.array[start:stop]), args)
+    finally:
+        src.close()
+        dst.close()
+
+
+def chunks(count, chunk_size):
+    """Return the (start, stop) bounds splitting count rows into chunks."""
+    return [(start, min(start + chunk_size, count))
+            for start in range(0, count, chunk_size)]
+
+
+class Executor:
+    """
+    A pool of worker processes for running batched operations. Use it as a
+    context manager, or call shutdown() when done, to reuse one pool across
+    many map_batch calls.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+        if self.workers > 1:
+            self._pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def map_batch(self, op, batch, *args, out=None, chunk_size=None):
+        """
+        Apply op to every row of batch and return the per-row results.
+
+        op is the name of a VectorBatch method ('dot', 'project_orthogonal',
+        ...) or a picklable callable taking a VectorBatch and args. batch
+        may be a SharedArray, a VectorBatch or a 2-D array. If out is a
+        SharedArray the results are written into it and it is returned;
+        otherwise a new ndarray is returned.
+        """
+        source = batch if isinstance(batch, SharedArray) else None
+        rows = source.array if source else (
+            batch.v if isinstance(batch, VectorBatch) else numpy.asarray(batch))
+        if rows.ndim != 2:
+            raise ValueError('map_batch needs a two-dimensional batch')
+        if chunk_size is None:
+            chunk_size = max(1, CHUNK_BYTES // max(1, rows[0:1].nbytes))
+
+        # Run the first row here to learn the result's shape and dtype.
+        probe = _apply(op, VectorBatch(rows[:1]), args)
+        shape = (len(rows),) + probe.shape[1:]
+        if out is not None and (out.shape != shape or out.dtype != probe.dtype):
+            raise ValueError('out must have shape {} and dtype {}'.format(
+                shape, probe.dtype))
+
+        bounds = chunks(len(rows), chunk_size)
+        if self._pool is None or len(bounds) < 2:
+            result = out.array if out is not None else numpy.empty(shape, probe.dtype)
+            for (start, stop) in bounds:
+                result[start:stop] = _apply(op, VectorBatch(rows[start:stop]), args)
+            return out if out is not None else result
+
+        temporary = []
+        try:
+            if source is None:
+                source = SharedArray.from_array(rows)
+                temporary.append(source)
+            dest = out
+            if dest is None:
+                dest = SharedArray(shape, probe.dtype)
+                temporary.append(dest)
+            futures = [self._pool.submit(_run_chunk, op, args, source.spec(),
+                                         dest.spec(), start, stop)
+                       for (start, stop) in bounds]
+            for future in futures:
+                future.result()
+            return out if out is not None else dest.array.copy()
+        finally:
+            for shared in temporary:
+                shared.close()
+
+
+def map_batch(op, batch, *args, workers=None, out=None, chunk_size=None):
+    """
+    Apply op to every row of batch using a temporary pool of workers
+    processes. See Executor.map_batch.
+    """
+    with Executor(workers) as executor:
+        return executor.map_batch(op, batch, *args, out=out,
+                                  chunk_size=chunk_size)
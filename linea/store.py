@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+``linea.store``
+
+A persistent, memory-mapped store of fixed-dimension vectors.
+
+A store file is a 64-byte header followed by the vectors as one row-major
+array::
+
+    offset  size  field
+    0       8     magic, b'LINEAVEC'
+    8       2     format version (little-endian uint16), currently 1
+    10      6     reserved
+    16      16    numpy dtype string, NUL padded (e.g. b'<f8')
+    32      8     dimension (little-endian uint64)
+    40      8     count (little-endian uint64)
+    48      16    reserved
+
+Opening a store only reads the header and maps the file, so it takes the
+same time whatever the file's size. Indexing returns Vectors and
+VectorBatches that view the mapped pages directly; the operating system
+pages the data in as operations touch it.
+
+Components:
+
++ class VectorStore
+"""
+import os
+import struct
+
+import numpy
+
+from .batch import VectorBatch
+from .vector import NonConformantVectors, Vector
+
+MAGIC = b'LINEAVEC'
+VERSION = 1
+HEADER = struct.Struct('<8sH6x16sQQ16x')
+HEADER_SIZE = HEADER.size
+COUNT_OFFSET = 40
+
+
+class VectorStore:
+    """
+    A memory-mapped file of vectors. Open an existing store with
+    VectorStore(path) (read-only) or VectorStore(path, writable=True), and
+    create a new one with VectorStore.create.
+    """
+
+    def __init__(self, path, writable=False):
+        self.path = path
+        self.writable = writable
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) != HEADER_SIZE:
+            raise ValueError('{} is too short to be a vector store'.format(path))
+        magic, version, dtype, dimension, count = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError('{} is not a vector store'.format(path))
+        if version != VERSION:
+            raise ValueError('unsupported vector store version {}'.format(version))
+        self.dtype = numpy.dtype(dtype.rstrip(b'\0').decode('ascii'))
+        self.dimension = dimension
+        self._count = count
+        self._map()
+
+    @classmethod
+    def create(cls, path, dimension, dtype=numpy.float64):
+        """Create an empty, writable store at path, replacing any file there."""
+        dtype = numpy.dtype(dtype).newbyteorder('<')
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, dtype.str.encode('ascii'),
+                                dimension, 0))
+        return cls(path, writable=True)
+
+    def _map(self):
+        if self._count == 0:
+            self._data = numpy.empty((0, self.dimension), dtype=self.dtype)
+            return
+        self._data = numpy.memmap(self.path, dtype=self.dtype,
+                                  mode='r+' if self.writable else 'r',
+                                  offset=HEADER_SIZE,
+                                  shape=(self._count, self.dimension))
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return 'VectorStore[{}x{}]'.format(self._count, self.dimension)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return (Vector(row) for row in self._data)
+
+    def __getitem__(self, item):
+        """
+        Return a Vector for an integer index, or a VectorBatch for a slice;
+        both view the mapped file without copying.
+        """
+        rows = self._data[item]
+        if rows.ndim == 1:
+            return Vector(rows)
+        return VectorBatch(rows)
+
+    @property
+    def array(self):
+        """The mapped count x dimension array."""
+        return self._data
+
+    def batch(self):
+        """Return a VectorBatch viewing every stored vector."""
+        return VectorBatch(self._data)
+
+    def append(self, vectors):
+        """
+        Append a Vector, VectorBatch, 2-D array or iterable of Vectors to the
+        end of the store.
+        """
+        if not self.writable:
+            raise IOError('{} is opened read-only'.format(self.path))
+        if isinstance(vectors, Vector):
+            rows = numpy.asarray(vectors.v).reshape(1, -1)
+        elif isinstance(vectors, VectorBatch):
+            rows = vectors.v
+        else:
+            rows = VectorBatch(vectors).v
+        if rows.shape[1] != self.dimension:
+            raise NonConformantVectors(self.dimension, rows.shape[1])
+
+        self.flush()
+        count = self._count + len(rows)
+        with open(self.path, 'r+b') as f:
+            f.seek(HEADER_SIZE + self._count * self.dimension * self.dtype.itemsize)
+            numpy.ascontiguousarray(rows, dtype=self.dtype).tofile(f)
+            f.seek(COUNT_OFFSET)
+            f.write(struct.pack('<Q', count))
+        self._count = count
+        self._map()
+
+    def flush(self):
+        """Write any changes made through the mapped views to disk."""
+        if isinstance(self._data, numpy.memmap) and self.writable:
+            self._data.flush()
+
+    def close(self):
+        """Flush and unmap the store."""
+        self.flush()
+        self._data = numpy.empty((0, self.dimension), dtype=self.dtype)
+
+    @property
+    def nbytes(self):
+        """The size of the store file in bytes."""
+        return os.path.getsize(self.path)
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+``linea.stream``
+
+Streaming pipelines over large collections of vectors.
+
+A pipeline pulls VectorBatch chunks of at most chunk_size rows from a
+source, passes each through its map and filter stages and hands it to a
+sink, so only a chunk per stage is held in memory whatever the size of
+the input::
+
+    basis = Vector(1, 0, 0)
+    (Pipeline(read_text('in.txt', chunk_size=4096))
+     .unit()
+     .project_orthogonal(basis)
+     .orthogonal_to(Vector(0, 1, 0))
+     .write_binary('out.lvs'))
+
+Text files hold one vector per line, written as ``[a; b; c]`` like
+``str(Vector)``; plain whitespace- or comma-separated values are also read.
+Binary files use the :py:mod:`linea.store` format.
+
+Components:
+
++ class Pipeline
++ function: from_vectors
++ function: read_text
++ function: write_text
++ function: read_binary
++ function: write_binary
+"""
+import collections.abc
+import itertools
+
+import numpy
+
+from .accumulate import Accumulator
+from .batch import VectorBatch
+from .store import VectorStore
+from .vector import Vector
+
+CHUNK_SIZE = 1024
+
+
+def from_vectors(vectors, chunk_size=CHUNK_SIZE):
+    """
+    Yield VectorBatch chunks from an iterable of Vectors (or sequences), a
+    VectorBatch or a 2-D array.
+    """
+    if isinstance(vectors, VectorBatch):
+        vectors = vectors.v
+    if isinstance(vectors, numpy.ndarray):
+        for start in range(0, len(vectors), chunk_size):
+            yield VectorBatch(vectors[start:start + chunk_size])
+        return
+    it = iter(vectors)
+    while True:
+        chunk = list(itertools.islice(it, chunk_size))
+        if not chunk:
+            return
+        yield VectorBatch(chunk)
+
+
+def _parse(line):
+    return [float(x) for x in
+            line.strip().strip('[]').replace(';', ' ').replace(',', ' ').split()]
+
+
+def read_text(path, chunk_size=CHUNK_SIZE):
+    """Yield VectorBatch chunks from a text file of one vector per line."""
+    with open(path, encoding='utf-8') as f:
+        lines = (line for line in f if line.strip())
+        while True:
+            chunk = [_parse(line) for line in itertools.islice(lines, chunk_size)]
+            if not chunk:
+                return
+            yield VectorBatch(numpy.array(chunk))
+
+
+def write_text(chunks, path):
+    """Write every vector in chunks to a text file, returning the count."""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for chunk in chunks:
+            for row in chunk.v.tolist():
+                f.write('[' + '; '.join(map(repr, row)) + ']\n')
+            count += len(chunk)
+    return count
+
+
+def read_binary(path, chunk_size=CHUNK_SIZE):
+    """
+    Yield VectorBatch chunks viewing a vector store file; the rows are
+    paged in from the mapped file as each chunk is used.
+    """
+    store = VectorStore(path)
+    for start in range(0, len(store), chunk_size):
+        yield store[start:start + chunk_size]
+
+
+def write_binary(chunks, path, dtype=None):
+    """
+    Write every vector in chunks to a new vector store file, returning the
+    count. The store's dtype is that of the first chunk unless given.
+    """
+    store = None
+    try:
+        for chunk in chunks:
+            if store is None:
+                store = VectorStore.create(path, chunk.dimension,
+                                           dtype or chunk.v.dtype)
+            store.append(chunk)
+        return 0 if store is None else len(store)
+    finally:
+        if store is not None:
+            store.close()
+
+
+def _run_stage(stage, chunks):
+    """Yield the non-empty chunks a ('map' or 'filter', fn) stage makes."""
+    (kind, fn) = stage
+    for chunk in chunks:
+        chunk = fn(chunk) if kind == 'map' else chunk[fn(chunk)]
+        if len(chunk):
+            yield chunk
+
+
+class _OneShot:  # pylint: disable=too-few-public-methods
+    """A source that can only be iterated once, such as a generator."""
+
+    def __init__(self, it):
+        self.it = it
+        self.used = False
+
+    def __iter__(self):
+        if self.used:
+            raise RuntimeError('the pipeline source is an iterator and has been used up')
+        self.used = True
+        return self.it
+
+
+class Pipeline:
+    """
+    A lazily evaluated chain of stages over a source of VectorBatch chunks.
+    Every stage method returns a new Pipeline; nothing runs until the
+    pipeline is iterated or passed to a sink. Each run starts again from
+    the source, so a pipeline over a list, array or other re-iterable
+    source can be run any number of times; one over an iterator, such as
+    read_text or read_binary, raises a RuntimeError if run a second time.
+    """
+
+    def __init__(self, source, stages=()):
+        """
+        source may be an iterable of VectorBatch chunks (such as read_text
+        or read_binary) or anything from_vectors accepts.
+        """
+        if isinstance(source, collections.abc.Iterator):
+            source = _OneShot(source)
+        self._source = source
+        self._stages = tuple(stages)
+
+    def __iter__(self):
+        source = self._source
+        if isinstance(source, (VectorBatch, numpy.ndarray, list, tuple)):
+            source = from_vectors(source)
+        chunks = (chunk for chunk in source if len(chunk))
+        for stage in self._stages:
+            chunks = _run_stage(stage, chunks)
+        return chunks
+
+    def map(self, fn):
+        """Apply fn, which takes and returns a VectorBatch, to every chunk."""
+        return Pipeline(self._source, self._stages + (('map', fn),))
+
+    def filter(self, fn):
+        """Keep the rows for which fn, given a chunk, returns True."""
+        return Pipeline(self._source, self._stages + (('filter', fn),))
+
+    def unit(self):
+        """Normalise every vector; zero vectors raise a ValueError."""
+        return self.map(VectorBatch.unit)
+
+    def drop_zero(self):
+        """Drop the zero vectors."""
+        return self.filter(lambda chunk: ~chunk.is_zero())
+
+    def project_parallel(self, basis):
+        """Replace every vector by its projection onto basis."""
+        return self.map(lambda chunk: chunk.project_parallel(basis))
+
+    def project_orthogonal(self, basis):
+        """Replace every vector by its component orthogonal to basis."""
+        return self.map(lambda chunk: chunk.project_orthogonal(basis))
+
+    def parallel_to(self, other):
+        """Keep the vectors parallel to other."""
+        return self.filter(lambda chunk: chunk.parallel_to(other))
+
+    def orthogonal_to(self, other):
+        """Keep the vectors orthogonal to other."""
+        return self.filter(lambda chunk: chunk.orthogonal_to(other))
+
+    def vectors(self):
+        """Yield the vectors one at a time."""
+        for chunk in self:
+            for row in chunk.v:
+                yield Vector(row)
+
+    def collect(self):
+        """Return every vector as one VectorBatch."""
+        chunks = [chunk.v for chunk in self]
+        if not chunks:
+            raise ValueError('the pipeline produced no vectors')
+        return VectorBatch(numpy.concatenate(chunks))
+
+    def accumulate(self):
+        """
+        Run the pipeline into an Accumulator of the sum, mean and variance
+        of its vectors, and return it.
+        """
+        accumulator = None
+        for chunk in self:
+            if accumulator is None:
+                accumulator = Accumulator(chunk.dimension)
+            accumulator.add_batch(chunk)
+        if accumulator is None:
+            raise ValueError('the pipeline produced no vectors')
+        return accumulator
+
+    def count(self):
+        """Run the pipeline and return the number of vectors it produced."""
+        return sum(len(chunk) for chunk in self)
+
+    def write_text(self, path):
+        """Run the pipeline into a text file, returning the count."""
+        return write_text(self, path)
+
+    def write_binary(self, path, dtype=None):
+        """Run the pipeline into a vector store file, returning the count."""
+        return write_binary(self, path, dtype)
@@ -9,6 +9,11 @@ import numpy
 
 EQUALITY_TOLERANCE = 0.001
 
+# Cosines within this many ulps of 1 or -1 are taken as exactly 1 or -1:
+# rounding leaves the cosine of exact multiples a few ulps short, and acos
+# turns a single ulp below 1 into an angle of 1.5e-08.
+COSINE_ULPS = 8
+
 
 def r2d(rval):
     """
@@ -27,6 +32,20 @@ def r2d(rval):
     return rval * 180 / math.pi
 
 
+def isclose(a, b, rtol=EQUALITY_TOLERANCE, atol=1e-08):
+    """
+    Return True if the scalars a and b are close, using the same (asymmetric)
+    test as numpy.isclose: :math:`|a - b| <= atol + rtol * |b|`. This avoids
+    numpy's array machinery for the scalar checks on the vector hot paths.
+
+    >>> isclose(0.99, 1.0, 0.1)
+    True
+    >>> isclose(1e-09, 0)
+    True
+    """
+    return abs(a - b) <= atol + rtol * abs(b)
+
+
 def clamp_if_close(value, clamped, tolerance=EQUALITY_TOLERANCE):
     """
     Return clamped if value is close to clamped (within tolerance), or return
@@ -37,6 +56,55 @@ def clamp_if_close(value, clamped, tolerance=EQUALITY_TOLERANCE):
     >>> clamp_if_close(0.99, 1.0, tolerance=0.001)
     0.99
     """
-    if numpy.isclose(value, clamped, tolerance):
+    if isclose(value, clamped, tolerance):
         return clamped
     return value
+
+
+def _slack(dtype):
+    """Return how far within 1 a cosine of dtype is treated as 1."""
+    return COSINE_ULPS * numpy.finfo(dtype).epsneg
+
+
+def acos_clamped(inner, tolerance=EQUALITY_TOLERANCE):
+    """
+    Return the arccos of the cosine inner. Values just outside [-1, 1] are
+    clamped as clamp_if_close would; values further out raise a
+    ValueError from math.acos. Values within COSINE_ULPS of 1 or -1 give
+    exactly 0 or pi.
+
+    >>> acos_clamped(1.0000001)
+    0.0
+    >>> acos_clamped(0.9999999999999999)
+    0.0
+    """
+    if inner > 1:
+        inner = clamp_if_close(inner, 1.0, tolerance)
+    if inner < -1:
+        inner = clamp_if_close(inner, -1.0, tolerance)
+    dtype = inner.dtype if isinstance(inner, numpy.floating) else float
+    if -1 <= inner <= 1 and abs(inner) >= 1 - _slack(dtype):
+        return 0.0 if inner > 0 else math.pi
+    return math.acos(inner)
+
+
+def arccos_clamped(inner, tolerance=EQUALITY_TOLERANCE):
+    """
+    Return the elementwise arccos of an array of cosines, as acos_clamped
+    would for each. Values just outside [-1, 1] are clamped; values
+    further out raise a ValueError, as math.acos does. inner is modified
+    in place.
+
+    >>> arccos_clamped(numpy.array([1.0000001, 0.0, -0.9999999999999999]))
+    array([0.        , 1.57079633, 3.14159265])
+    """
+    high = inner > 1
+    inner[high & numpy.isclose(inner, 1.0, tolerance)] = 1.0
+    low = inner < -1
+    inner[low & numpy.isclose(inner, -1.0, tolerance)] = -1.0
+    magnitude = numpy.abs(inner)
+    if (magnitude > 1).any():
+        raise ValueError('math domain error')
+    snap = magnitude >= 1 - _slack(inner.dtype)
+    inner[snap] = numpy.sign(inner[snap])
+    return numpy.arccos(inner)
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+``linea.wire``
+
+A compact, versioned binary format for sending Vectors, SparseVectors and
+VectorBatches between processes and services.
+
+A message is a 32-byte header followed by the raw little-endian array
+data::
+
+    offset  size  field
+    0       4     magic, b'LNW\\0'
+    4       2     format version (little-endian uint16), currently 1
+    6       1     kind: 0 Vector, 1 VectorBatch, 2 SparseVector
+    7       1     reserved
+    8       8     numpy dtype string of the values, NUL padded (e.g. b'<f8')
+    16      8     rows (little-endian uint64): the dimension of a Vector or
+                  SparseVector, the count of a VectorBatch
+    24      8     columns (little-endian uint64): 1 for a Vector, the
+                  dimension of a VectorBatch, the number of stored
+                  components of a SparseVector
+
+A Vector's or batch's payload is its components; a SparseVector's is its
+indices, as little-endian int64, then its values. The payload starts on an
+8-byte boundary of the message, so decoding views it in place: decode
+returns objects backed by the buffer passed in, without copying (they are
+read-only if the buffer is, as bytes are). Encoding copies the data once,
+or not at all with write and encode_into.
+
+>>> from linea.vector import Vector
+>>> message = encode(Vector(1.0, 2.0, 3.0))
+>>> len(message)
+56
+>>> print(decode(message))
+[1.0; 2.0; 3.0]
+
+Components:
+
++ function: encode
++ function: encode_into
++ function: encoded_size
++ function: write
++ function: decode
++ function: read
+"""
+import struct
+
+import numpy
+
+from .batch import VectorBatch
+from .vector import SparseVector, Vector
+
+MAGIC = b'LNW\0'
+VERSION = 1
+HEADER = struct.Struct('<4sHBx8sQQ')
+HEADER_SIZE = HEADER.size
+
+VECTOR = 0
+BATCH = 1
+SPARSE = 2
+
+
+def _little(a):
+    """Return a as a C-contiguous, little-endian array, copying if needed."""
+    dtype = a.dtype.newbyteorder('<') if a.dtype.byteorder == '>' else a.dtype
+    return numpy.ascontiguousarray(a, dtype=dtype)
+
+
+def _bytes(a):
+    """Return a byte view of the contiguous array a."""
+    return memoryview(a.reshape(-1).view(numpy.uint8))
+
+
+def _parts(obj):
+    """Return the header and the payload arrays for obj."""
+    if isinstance(obj, SparseVector):
+        values = _little(obj.values)
+        arrays = (_little(obj.indices.astype(numpy.int64, copy=False)), values)
+        (kind, rows, columns) = (SPARSE, len(obj), obj.nnz)
+    elif isinstance(obj, VectorBatch):
+        values = _little(obj.v)
+        arrays = (values,)
+        (kind, rows, columns) = (BATCH,) + values.shape
+    elif isinstance(obj, Vector):
+        values = _little(numpy.asarray(obj.v))
+        arrays = (values,)
+        (kind, rows, columns) = (VECTOR, len(values), 1)
+    else:
+        raise TypeError('cannot encode a {}'.format(type(obj).__name__))
+    if values.dtype.hasobject:
+        raise TypeError('cannot encode object arrays')
+    dtype = values.dtype.str.replace('|', '<').encode('ascii')
+    header = HEADER.pack(MAGIC, VERSION, kind, dtype, rows, columns)
+    return header, arrays
+
+
+def encoded_size(obj):
+    """Return the number of bytes encode(obj) produces."""
+    (header, arrays) = _parts(obj)
+    return len(header) + sum(a.nbytes for a in arrays)
+
+
+def encode(obj):
+    """Return the Vector, SparseVector or VectorBatch obj as bytes."""
+    (header, arrays) = _parts(obj)
+    return b''.join([header] + [_bytes(a) for a in arrays])
+
+
+def encode_into(obj, buffer, offset=0):
+    """
+    Encode obj into the writable buffer (a bytearray, mmap, shared memory
+    block, ...) starting offset bytes in, returning the number of bytes
+    written.
+    """
+    (header, arrays) = _parts(obj)
+    out = memoryview(buffer).cast('B')
+    size = len(header) + sum(a.nbytes for a in arrays)
+    if offset + size > len(out):
+        raise ValueError('{} bytes do not fit in the buffer'.format(size))
+    out[offset:offset + len(header)] = header
+    position = offset + len(header)
+    for a in arrays:
+        out[position:position + a.nbytes] = _bytes(a)
+        position += a.nbytes
+    return size
+
+
+def write(obj, f):
+    """
+    Write obj to the binary file f without copying its data, returning the
+    number of bytes written.
+    """
+    (header, arrays) = _parts(obj)
+    f.write(header)
+    for a in arrays:
+        f.write(_bytes(a))
+    return len(header) + sum(a.nbytes for a in arrays)
+
+
+def _header(buffer, offset):
+    header = bytes(buffer[offset:offset + HEADER_SIZE])
+    if len(header) != HEADER_SIZE:
+        raise ValueError('message is too short')
+    (magic, version, kind, dtype, rows, columns) = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError('not a linea message')
+    if version != VERSION:
+        raise ValueError('unsupported message version {}'.format(version))
+    if kind not in (VECTOR, BATCH, SPARSE):
+        raise ValueError('unknown message kind {}'.format(kind))
+    return kind, numpy.dtype(dtype.rstrip(b'\0').decode('ascii')), rows, columns
+
+
+def _payload_size(kind, dtype, rows, columns):
+    if kind == SPARSE:
+        return columns * (8 + dtype.itemsize)
+    return rows * columns * dtype.itemsize
+
+
+def decode(buffer, offset=0):
+    """
+    Return the Vector, SparseVector or VectorBatch encoded in buffer
+    (bytes, bytearray, memoryview, mmap, ...) at offset, viewing the
+    buffer's memory rather than copying it.
+    """
+    (kind, dtype, rows, columns) = _header(buffer, offset)
+    start = offset + HEADER_SIZE
+    if memoryview(buffer).nbytes < start + _payload_size(kind, dtype, rows, columns):
+        raise ValueError('message is truncated')
+    if kind == SPARSE:
+        indices = numpy.frombuffer(buffer, '<i8', columns, start)
+        values = numpy.frombuffer(buffer, dtype, columns, start + 8 * columns)
+        return SparseVector._sorted(rows, indices, values)
+    values = numpy.frombuffer(buffer, dtype, rows * columns, start)
+    if kind == BATCH:
+        return VectorBatch(values.reshape(rows, columns))
+    return Vector(values, dtype=values.dtype)
+
+
+def read(f):
+    """
+    Read one message from the binary file f and return what it encodes,
+    or None at the end of the file.
+    """
+    header = f.read(HEADER_SIZE)
+    if not header:
+        return None
+    (kind, dtype, rows, columns) = _header(header, 0)
+    message = bytearray(HEADER_SIZE + _payload_size(kind, dtype, rows, columns))
+    message[:HEADER_SIZE] = header
+    view = memoryview(message)[HEADER_SIZE:]
+    while len(view):
+        count = f.readinto(view)
+        if not count:
+            raise ValueError('message is truncated')
+        view = view[count:]
+    return decode(message)
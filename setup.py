@@ -16,6 +16,9 @@ setup(
     author_email='kyle@imap.cc',
     url='https://git.metacircular.net/kyle/pylinea',
     license=license,
-    packages=find_packages(exclude=('tests', 'docs'))
+    packages=find_packages(exclude=('tests', 'docs')),
+    entry_points={
+        'console_scripts': ['linea-bench = linea.bench:main'],
+    },
 )
 
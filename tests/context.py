@@ -6,4 +6,19 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 # the below are used for imports by other modules.
 
 import linea
+import linea.accumulate as accumulate
+import linea.batch as batch
+import linea.bench as bench
+import linea.engine as engine
+import linea.group as group
+import linea.index as index
+import linea.instrument as instrument
+import linea.lazy as lazy
+import linea.memo as memo
+import linea.mesh as mesh
+import linea.pairwise as pairwise
+import linea.parallel as parallel
+import linea.store as store
+import linea.stream as stream
 import linea.vector as vec
+import linea.wire as wire
@@ -1,8 +1,23 @@
 import linea.vector as vec
 import linea.util as util
+import array
+import asyncio
+import collections
+import concurrent.futures
+import fractions
+import io
+import math
 import numpy
+import pickle
 import pytest
-from .context import vec
+import threading
+import time
+import tracemalloc
+import weakref
+from .context import accumulate, batch, bench, engine, group, index, instrument, lazy, memo, mesh, pairwise, parallel, store, stream, vec, wire
+
+# The tests run with every invariant check enabled.
+vec.set_validation(vec.STRICT)
 
 
 def fequal(a, b):
@@ -42,6 +57,10 @@ def test_basic_operations():
     assert (k * v1 == v2)
     assert (v1 * k == v2)
 
+    single = numpy.array([0.1, 1 / 3], dtype=numpy.float32)
+    assert str(vec.Vector(single)) == '[0.1; 0.33333334]'
+    assert str(vec.SparseVector(3, [1], single[:1])) == '{1: 0.1}[3]'
+
 
 # Video 6
 def test_magnitude():
@@ -91,6 +110,10 @@ def test_dot_product():
     v9 = vec.Vector(0, 0)
     with pytest.raises(ValueError):
         v1.angle_with(v9)
+    # Each vector is tested for zero, not the product of their magnitudes.
+    assert fequal(vec.angle(vec.Vector(1e-5, 0.0), vec.Vector(0.0, 1e-5)), math.pi / 2)
+    with pytest.raises(ValueError):
+        vec.angle(vec.Vector(1e-9, 0.0), vec.Vector(1e6, 1.0))
 
 
 # Video 10.
@@ -164,4 +187,1013 @@ def test_cross_product():
     v6 = vec.Vector(1.500, 9.547, 3.691)
     v7 = vec.Vector(-6.007, 0.124, 5.772)
     area = 42.565
-    assert fequal(vec.area_triangle(v6, v7), area)
\ No newline at end of file
+    assert fequal(vec.area_triangle(v6, v7), area)
+
+def test_batch():
+    vs = [vec.Vector(3.039, 1.879), vec.Vector(-7.579, -7.88),
+          vec.Vector(2.118, 4.827), vec.Vector(0, 0)]
+    basis = vec.Vector(0.825, 2.036)
+    b = batch.VectorBatch(vs)
+    assert b.shape == (4, 2)
+
+    dots = b.dot(basis)
+    mags = b.magnitude()
+    parallel = b.parallel_to(basis)
+    orthogonal = b.orthogonal_to(basis)
+    for i, v in enumerate(vs):
+        assert fequal(dots[i], vec.dot(v, basis))
+        assert fequal(mags[i], v.magnitude())
+        assert parallel[i] == vec.parallel(v, basis)
+        assert orthogonal[i] == vec.orthogonal(v, basis)
+        assert b.project_parallel(basis)[i] == v.project_parallel(basis)
+        assert b.project_orthogonal(basis)[i] == v.project_orthogonal(basis)
+
+    nonzero = b[:3]
+    assert fequal(nonzero.angle(basis),
+                  [vec.angle(v, basis) for v in vs[:3]])
+    assert (nonzero.angle(nonzero, in_degrees=True) < 1e-4).all()
+    assert nonzero.unit()[1] == vs[1].unit()
+    assert nonzero.parallel_to(batch.VectorBatch([[-1, -1], [22.737, 23.64], [1, 0]])).tolist() == \
+        [False, True, False]
+
+    with pytest.raises(ValueError):
+        b.unit()
+    with pytest.raises(ValueError):
+        b.angle(basis)
+    with pytest.raises(vec.NonConformantVectors):
+        b.dot(vec.Vector(1, 2, 3))
+    with pytest.raises(vec.NonConformantVectors):
+        b.parallel_to(vec.Vector(1, 2, 3))
+    with pytest.raises(vec.NonConformantVectors):
+        b.orthogonal_to(batch.VectorBatch([[1, 2, 3]]))
+    assert batch.VectorBatch([], dimension=2).shape == (0, 2)
+    assert batch.VectorBatch(numpy.empty((0, 2))).shape == (0, 2)
+    with pytest.raises(ValueError):
+        batch.VectorBatch([])
+
+    # Randomised parity with the scalar functions, including exact multiples.
+    rng = numpy.random.default_rng(5)
+    left = rng.standard_normal((300, 4))
+    right = numpy.concatenate([left[:150] * rng.uniform(-10, 10, (150, 1)),
+                               rng.standard_normal((150, 4))])
+    pairs = [(vec.Vector(v), vec.Vector(w)) for (v, w) in zip(left, right)]
+    lb = batch.VectorBatch(left)
+    rb = batch.VectorBatch(right)
+    assert lb.parallel_to(rb).tolist() == [vec.parallel(v, w) for (v, w) in pairs]
+    assert lb.parallel_to(rb)[:150].all()
+    assert numpy.allclose(lb.angle(rb), [vec.angle(v, w) for (v, w) in pairs],
+                          rtol=0, atol=1e-12)
+
+
+def test_validation():
+    v1 = vec.Vector(1, 2, -1)
+    v2 = vec.Vector(3, 1, 0)
+    v3 = vec.Vector(1, 2)
+    assert vec.get_validation() == vec.STRICT
+    for mode in vec.VALIDATION_MODES:
+        assert fequal(vec.dot(v1, v2, validate=mode), 5)
+        assert fequal(vec.angle(v1, v2, validate=mode), vec.angle(v1, v2))
+    with pytest.raises(vec.NonConformantVectors):
+        vec.dot(v1, v3, validate=vec.DEFAULT)
+    with pytest.raises(ValueError):
+        vec.dot(v1, v3, validate=vec.FAST)
+    with pytest.raises(ValueError):
+        vec.dot(v1, v2, validate='loose')
+
+    with vec.validation(vec.FAST):
+        assert vec.get_validation() == vec.FAST
+        assert vec.orthogonal(v1, vec.Vector(1, 0, 1))
+    assert vec.get_validation() == vec.STRICT
+    with pytest.raises(ValueError):
+        vec.set_validation('loose')
+
+
+def test_frozen():
+    v1 = vec.Vector(3.039, 1.879)
+    basis = vec.Vector(0.825, 2.036).freeze()
+    assert isinstance(basis, vec.FrozenVector)
+    assert basis.freeze() is basis
+    with pytest.raises(ValueError):
+        basis.v[0] = 1
+
+    unit = basis.unit()
+    assert unit is basis.unit()
+    assert unit == vec.Vector(0.825, 2.036).unit()
+    assert fequal(unit.magnitude(), 1)
+    assert v1.project_parallel(basis) == vec.Vector(1.0826, 2.6717)
+    assert fequal(v1.angle_with(basis), vec.angle(v1, vec.Vector(0.825, 2.036)))
+
+    assert hash(basis) == hash(vec.FrozenVector(0.825, 2.036))
+    assert len({basis, vec.FrozenVector([0.825, 2.036])}) == 1
+    with pytest.raises(TypeError):
+        hash(v1)
+
+    source = numpy.array([1.0, 2.0])
+    frozen = vec.FrozenVector(source)
+    source[0] = 5
+    assert frozen[0] == 1.0
+    with pytest.raises(ValueError):
+        vec.FrozenVector(0, 0).unit()
+
+    # A writable buffer is refused for a frozen vector (PEP 688, 3.12+).
+    with pytest.raises(BufferError):
+        basis.__buffer__(vec.PyBUF_WRITABLE)
+    assert basis.__buffer__(0).readonly
+    assert not v1.__buffer__(vec.PyBUF_WRITABLE).readonly
+
+
+def test_small_vectors():
+    v1 = vec.Vec3(8.462, 7.893, -8.187)
+    v2 = vec.Vec3(6.984, -5.975, 4.778)
+    assert vec.cross(v1, v2) == vec.Vector(-11.205, -97.609, -105.685)
+    assert isinstance(vec.cross(v1, v2), vec.Vec3)
+    assert fequal(vec.area_triangle(vec.Vec3(1.500, 9.547, 3.691),
+                                    vec.Vec3(-6.007, 0.124, 5.772)), 42.565)
+    assert fequal(vec.dot(v1, v2), vec.dot(vec.Vector(v1.v), vec.Vector(v2.v)))
+    assert str(vec.Vec2(1, 2)) == '[1.0; 2.0]'
+    assert list(vec.Vec2(1, 2)) == [1.0, 2.0]
+
+    v3 = vec.Vec2(3.039, 1.879)
+    v4 = vec.Vec2(0.825, 2.036)
+    assert v3.project_parallel(v4) == vec.Vector(1.0826, 2.6717)
+    assert v3 - v4 == vec.Vector(2.214, -0.157)
+    assert v3 + vec.Vector(1, 1) == vec.Vector(4.039, 2.879)
+    assert vec.Vec2(-7.579, -7.88).parallel_to(vec.Vec2(22.737, 23.64))
+    with pytest.raises(vec.NonConformantVectors):
+        vec.Vec2(1, 2, 3)
+    with pytest.raises(vec.NonConformantVectors):
+        v3 + v1
+
+    assert type(vec.Vector(1, 2)) is vec.Vector
+    previous = vec.set_small_vectors(True)
+    try:
+        assert type(vec.Vector(1, 2)) is vec.Vec2
+        assert type(vec.Vector([1, 2, 3])) is vec.Vec3
+        assert type(vec.Vector(1, 2, dtype=None)) is vec.Vec2
+        data = numpy.zeros(3)
+        view = vec.Vector(data)
+        assert type(view) is vec.Vector and view.v is data
+        view += vec.Vector(1, 2, 3)
+        assert data.tolist() == [1, 2, 3]
+        assert type(vec.Vector(1, 2, 3, 4)) is vec.Vector
+        assert type(vec.Vector(['a', 'b'])) is vec.Vector
+    finally:
+        vec.set_small_vectors(previous)
+    assert type(vec.Vec2(1, 2) * numpy.float64(2)) is vec.Vec2
+    assert type(vec.Vec3(1, 2, 3) * numpy.int64(2)) is vec.Vec3
+    assert vec.Vec2(1, 2, dtype=numpy.float64) == vec.Vec2(1, 2)
+    with pytest.raises(ValueError):
+        vec.Vec2(1, 2, dtype=numpy.int32)
+    for v in (vec.Vector(numpy.arange(3.0)), vec.Vec3(1, 2, 3)):
+        assert weakref.ref(v)() is v
+
+
+def test_bench(tmpdir):
+    results = bench.run(dims=(3,), dtypes=('float64',),
+                        operations=('dot', 'cross'), samples=3, min_time=0)
+    assert sorted(results['results']) == ['cross/3/float64', 'dot/3/float64']
+    for r in results['results'].values():
+        assert r['ops_per_sec'] > 0
+        assert r['p50'] <= r['p90'] <= r['p99']
+        assert r['bytes_allocated'] >= 0
+
+    slower = {'results': {k: dict(r, ops_per_sec=r['ops_per_sec'] / 2)
+                          for k, r in results['results'].items()}}
+    assert bench.compare(results, results) == []
+    assert bench.compare(slower, results, threshold=0.25)[0][0] == 'cross/3/float64'
+
+    output = str(tmpdir.join('bench.json'))
+    args = ['--dims', '3', '--dtypes', 'float64', '--ops', 'dot',
+            '--samples', '3', '--output', output]
+    assert bench.main(args) == 0
+    assert bench.main(args + ['--baseline', output, '--threshold', '-1']) == 1
+
+
+def test_pairwise():
+    vs = [vec.Vector(3.039, 1.879), vec.Vector(-7.579, -7.88),
+          vec.Vector(22.737, 23.64), vec.Vector(7.88, -7.579),
+          vec.Vector(0, 0)]
+    nonzero = vs[:4]
+    # A tiny memory budget forces many tiles.
+    dots = pairwise.pairwise(vs, metric='dot', memory=16)
+    angles = pairwise.pairwise(nonzero, metric='angle', memory=16)
+    cosines = pairwise.pairwise(batch.VectorBatch(nonzero), nonzero[:2],
+                                metric='cosine')
+    assert angles.shape == (4, 4)
+    for i, v in enumerate(vs):
+        for j, w in enumerate(vs):
+            assert fequal(dots[i, j], vec.dot(v, w))
+    for i, v in enumerate(nonzero):
+        for j, w in enumerate(nonzero):
+            assert fequal(angles[i, j], vec.angle(v, w))
+        assert fequal(cosines[i], [vec.dot(v.unit(), w.unit())
+                                   for w in nonzero[:2]])
+
+    rows, cols = pairwise.pairs(vs, relation='parallel', memory=16)
+    found = set(zip(rows.tolist(), cols.tolist()))
+    assert found == {(i, j) for i in range(5) for j in range(5)
+                     if vec.parallel(vs[i], vs[j])}
+    rows, cols = pairwise.pairs(vs, relation='orthogonal', memory=16)
+    found = set(zip(rows.tolist(), cols.tolist()))
+    assert found == {(i, j) for i in range(5) for j in range(5)
+                     if vec.orthogonal(vs[i], vs[j])}
+    rows, cols = pairwise.pairs(nonzero, relation=lambda t: t > 1.5)
+    assert set(zip(rows.tolist(), cols.tolist())) == {
+        (i, j) for i in range(4) for j in range(4)
+        if vec.angle(nonzero[i], nonzero[j]) > 1.5}
+
+    # Exact multiples, whose cosines fall a few ulps short of 1.
+    rng = numpy.random.default_rng(6)
+    left = rng.standard_normal((300, 4))
+    right = left * rng.uniform(-10, 10, (300, 1))
+    rows, cols = pairwise.pairs(left, right, relation='parallel', memory=4096)
+    found = set(zip(rows.tolist(), cols.tolist()))
+    for i in range(300):
+        assert ((i, i) in found) == vec.parallel(vec.Vector(left[i]), vec.Vector(right[i]))
+    assert all((i, i) in found for i in range(300))
+
+    with pytest.raises(ValueError):
+        pairwise.pairwise(vs, metric='angle')
+    with pytest.raises(vec.NonConformantVectors):
+        pairwise.pairwise(vs, [vec.Vector(1, 2, 3)])
+
+
+def test_index():
+    vs = [vec.Vector(3.039, 1.879), vec.Vector(-7.579, -7.88),
+          vec.Vector(2.118, 4.827), vec.Vector(0, 0)]
+    query = vec.Vector(0.825, 2.036)
+    exact = index.ExactIndex(2)
+    keys = exact.add_batch(vs)
+    assert keys == [0, 1, 2, 3]
+    assert exact.add(vec.Vector(1, 1), key='one') == 'one'
+    with pytest.raises(KeyError):
+        exact.add(vec.Vector(1, 1), key='one')
+    with pytest.raises(vec.NonConformantVectors):
+        exact.add(vec.Vector(1, 2, 3))
+    explicit = index.ExactIndex(2)
+    assert explicit.add(vec.Vector(1, 1), key=0) == 0
+    assert explicit.add_batch([vec.Vector(1, 2), vec.Vector(2, 1)]) == [1, 2]
+    with pytest.raises(KeyError):
+        explicit.add_batch(numpy.array([[1, 0], [0, 1]]), keys=['a', 'a'])
+    assert len(explicit) == 3 and 'a' not in explicit
+    assert explicit.add([3.0, 4.0]) == 3
+    assert explicit.add_batch([]) == [] and len(explicit) == 4
+    with pytest.raises(ValueError):
+        explicit.query(query, k=0)
+    # Angles agree with angle() for exact multiples.
+    multiple = vec.Vector(numpy.array([0.816, 0.003]))
+    explicit.add(multiple * 4, key='multiple')
+    assert explicit.query(multiple)[0] == ('multiple', vec.angle(multiple, multiple * 4)) == ('multiple', 0.0)
+
+    results = exact.query(query, k=2)
+    assert [k for (k, _) in results] == [2, 'one']
+    assert fequal(results[0][1], vec.angle(vs[2], query))
+    assert [k for (k, _) in exact.query(query, k=10)] == [2, 'one', 0, 1]
+    assert exact.query(query, metric='dot')[0][0] == 2
+    with pytest.raises(ValueError):
+        exact.query(vs[3])
+
+    exact.remove(2)
+    assert 2 not in exact and len(exact) == 4
+    assert exact.query(query)[0][0] == 'one'
+    assert exact.get(1) == vs[1]
+
+    rng = numpy.random.default_rng(1)
+    data = rng.standard_normal((2000, 16))
+    approx = index.LSHIndex(16, bits=8, tables=16, seed=1)
+    brute = index.ExactIndex(16)
+    approx.add_batch(data)
+    brute.add_batch(data)
+    hits = 0
+    for q in rng.standard_normal((20, 16)):
+        found = approx.query(vec.Vector(q), k=5)
+        assert all(fequal(a, vec.angle(vec.Vector(q), approx.get(k)))
+                   for (k, a) in found)
+        hits += len({k for k, _ in found} & {k for k, _ in brute.query(q, k=5)})
+    assert hits >= 80
+    for key in range(1000):
+        approx.remove(key)
+    assert len(approx) == 1000
+    assert all(k >= 1000 for (k, _) in approx.query(data[0], k=5))
+
+
+def test_parallel_groups():
+    rng = numpy.random.default_rng(2)
+    directions = rng.standard_normal((50, 5))
+    vs = [vec.Vector(d) for d in directions]
+    vs += [vec.Vector(d * k) for k in (-0.5, -3, 0.7, 13) for d in directions]
+    vs += [vec.Vector(numpy.zeros(5))]
+    groups, zeros = group.parallel_groups(vs)
+    assert zeros == [250]
+    assert len(groups) == 50
+    assert sorted(sum(groups, [])) == list(range(250))
+    for g in groups:
+        assert len(g) == 5
+        for i in g[1:]:
+            assert vec.parallel(vs[g[0]], vs[i])
+    reps = [g[0] for g in groups]
+    assert not any(vec.parallel(vs[i], vs[j]) for i in reps for j in reps if i < j)
+    assert group.parallel_groups(batch.VectorBatch([[0, 0]])) == ([], [0])
+    # Positive multiples have cosines a few ulps below 1.
+    d = numpy.random.default_rng(1).standard_normal(4)
+    multiples = [d * k for k in numpy.random.default_rng(1).uniform(0.1, 10, 5)]
+    assert len(group.parallel_groups(multiples)[0]) == 1
+
+    # More projections at high dimension keep grouping near-linear.
+    directions = rng.standard_normal((1000, 1000))
+    scaled = numpy.vstack([directions, directions * -2.5])
+    groups, _ = group.parallel_groups(scaled)
+    assert sorted(groups) == [[i, i + 1000] for i in range(1000)]
+    width = 8 * (1e-08 + util.EQUALITY_TOLERANCE * math.pi)
+    assert group._projections(8, 8000, width) == group.PROJECTIONS
+    assert (group.PROJECTIONS < group._projections(1000, 8000, width) <
+            group._projections(4000, 8000, width) <= group.MAX_PROJECTIONS)
+    units = directions / numpy.sqrt((directions ** 2).sum(axis=1))[:, None]
+    points = units @ group._projection(1000, group._projections(1000, 1000, width), 0)
+    homes = collections.Counter(probes[0] for probes in group._cells(points, width, width / 8))
+    assert max(homes.values()) <= 5
+
+
+def test_parallel_map_batch():
+    rng = numpy.random.default_rng(3)
+    rows = rng.standard_normal((1000, 8))
+    basis = vec.Vector(rng.standard_normal(8))
+    single = parallel.map_batch('project_orthogonal', rows, basis,
+                                workers=1, chunk_size=64)
+    assert vec.Vector(rows[10]).project_orthogonal(basis) == vec.Vector(single[10])
+
+    with parallel.Executor(2) as executor:
+        multi = executor.map_batch('project_orthogonal', batch.VectorBatch(rows),
+                                   basis, chunk_size=64)
+        assert (multi == single).all()
+        with parallel.SharedArray.from_array(rows) as source, \
+                parallel.SharedArray((1000,), numpy.bool_) as out:
+            assert executor.map_batch('orthogonal_to', source, basis,
+                                      out=out, chunk_size=64) is out
+            assert (out.array == batch.VectorBatch(rows).orthogonal_to(basis)).all()
+            with pytest.raises(ValueError):
+                executor.map_batch('dot', source, basis, out=out)
+    assert parallel.chunks(10, 4) == [(0, 4), (4, 8), (8, 10)]
+
+
+def test_store(tmpdir):
+    path = str(tmpdir.join('vectors.lvs'))
+    with store.VectorStore.create(path, 3) as vs:
+        assert len(vs) == 0
+        vs.append(vec.Vector(1, 2, 3))
+        vs.append([vec.Vector(4, 5, 6), vec.Vector(-1, 0, 1)])
+        vs.append(numpy.ones((2, 3), dtype=numpy.float32))
+        with pytest.raises(vec.NonConformantVectors):
+            vs.append(vec.Vector(1, 2))
+    assert vs.nbytes == store.HEADER_SIZE + 5 * 3 * 8
+
+    with store.VectorStore(path) as vs:
+        assert len(vs) == 5 and vs.dimension == 3
+        assert vs[1] == vec.Vector(4, 5, 6)
+        assert numpy.shares_memory(vs[1].v, vs.array)
+        assert numpy.shares_memory(vs[1:3].v, vs.array)
+        assert fequal(vs[0:2].dot(vec.Vector(1, 1, 1)), [6, 15])
+        assert vs[2].orthogonal_to(vec.Vector(1, 0, 1))
+        with pytest.raises(IOError):
+            vs.append(vec.Vector(1, 2, 3))
+        with pytest.raises(ValueError):
+            vs.array[0, 0] = 5
+
+    with open(path, 'r+b') as f:
+        f.write(b'NOTLINEA')
+    with pytest.raises(ValueError):
+        store.VectorStore(path)
+
+
+def test_stream(tmpdir):
+    basis = vec.Vector(1, 0, 0)
+    other = vec.Vector(0, 1, 0)
+    vs = [vec.Vector(3, 4, 0), vec.Vector(0, 0, 0), vec.Vector(1, 2, 2),
+          vec.Vector(-2, 0, 5), vec.Vector(1, 1, 1)]
+    text = str(tmpdir.join('in.txt'))
+    assert stream.Pipeline(stream.from_vectors(vs, chunk_size=2)).write_text(text) == 5
+
+    expected = [v.unit().project_orthogonal(basis) for v in vs if not v.is_zero()]
+    expected = [v for v in expected if v.orthogonal_to(other)]
+    result = (stream.Pipeline(stream.read_text(text, chunk_size=2))
+              .drop_zero()
+              .unit()
+              .project_orthogonal(basis)
+              .orthogonal_to(other))
+    binary = str(tmpdir.join('out.lvs'))
+    assert result.write_binary(binary) == len(expected) == 1
+    assert list(stream.Pipeline(stream.read_binary(binary)).vectors()) == expected
+
+    kept = stream.Pipeline(vs).parallel_to(vec.Vector(6, 8, 0))
+    assert len(kept.collect()) == 2 and kept.count() == 2
+    once = stream.Pipeline(stream.read_binary(binary)).unit()
+    assert once.count() == 1
+    with pytest.raises(RuntimeError):
+        once.count()
+    assert stream.Pipeline(numpy.ones((10, 3))).map(lambda c: c.unit()).count() == 10
+    with pytest.raises(ValueError):
+        stream.Pipeline(vs).unit().count()
+    with open(text, 'w') as f:
+        f.write('1, 2\n\n3 4\n[5; 6]\n')
+    assert stream.Pipeline(stream.read_text(text)).collect().v.tolist() == \
+        [[1, 2], [3, 4], [5, 6]]
+
+
+def test_zero_copy():
+    data = array.array('d', [1, 2, 3, 4])
+    v1 = vec.Vector(data)
+    data[0] = 10
+    assert v1[0] == 10
+
+    raw = numpy.arange(8, dtype='<f4').tobytes()
+    v2 = vec.Vector.from_buffer(raw, dtype='<f4', count=3, offset=8)
+    assert list(v2) == [2.0, 3.0, 4.0]
+    assert not v2.v.flags.writeable
+
+    backing = numpy.arange(10.0)
+    v3 = vec.Vector.view(backing, offset=4, count=3)
+    assert numpy.shares_memory(v3.v, backing)
+    assert v3 == vec.Vector(4, 5, 6)
+    with pytest.raises(ValueError):
+        vec.Vector.view(backing, offset=8, count=3)
+    for offset in (11, -1):
+        with pytest.raises(ValueError):
+            vec.Vector.view(backing, offset=offset)
+    assert len(vec.Vector.view(backing, offset=10)) == 0
+    assert len(vec.Vector.view(backing, dtype=numpy.int32)) == 20
+
+    assert numpy.asarray(v3) is v3.v
+    assert numpy.asarray(v3, dtype=numpy.float32).dtype == numpy.float32
+    assert len(vec.Vector(5)) == 1
+    assert [type(x) for x in vec.Vector(1.5, 2.5)] == [float, float]
+    assert fequal(numpy.dot(v3, v3), vec.dot(v3, v3))
+
+
+def test_inplace():
+    v1 = vec.Vector(8.218, -9.341)
+    array = v1.v
+    v1 += vec.Vector(-1.129, 2.111)
+    assert v1 == vec.Vector(7.089, -7.230) and v1.v is array
+    v1 -= vec.Vector(7.089, -7.230)
+    v1 *= 3
+    assert v1 == vec.Vector(0, 0) and v1.v is array
+    v2 = vec.Vector(1, 2)
+    v2 *= 2.5
+    assert v2 == vec.Vector(2.5, 5)
+    frozen = vec.FrozenVector(1.0, 2.0)
+    result = frozen
+    result += vec.Vector(1, 1)
+    assert frozen == vec.Vector(1, 2) and result == vec.Vector(2, 3)
+    small = vec.Vec2(1, 2)
+    small += vec.Vector(1, 1)
+    assert small == vec.Vector(2, 3) and type(small) is vec.Vec2
+    with pytest.raises(vec.NonConformantVectors):
+        v1 += vec.Vector(1, 2, 3)
+
+    v4 = vec.Vector(-9.88, -3.264, -8.159)
+    v5 = vec.Vector(-2.155, -9.353, -9.473)
+    out = vec.Vector(numpy.empty(3))
+    assert v4.project_orthogonal(v5, out=out) is out
+    assert out == vec.Vector(-8.350, 3.376, -1.434)
+    assert v4.project_parallel(v5, out=out) == v4.project_parallel(v5)
+    assert v4.unit(out=out) == v4.unit()
+    assert v4.freeze().unit(out=out) is out and out == v4.unit()
+    assert vec.cross(v4, v5, out=out) == vec.cross(v4, v5)
+    assert vec.cross(v4, v5, out=vec.Vec3(0, 0, 0)) == vec.cross(v4, v5)
+    with pytest.raises(vec.NonConformantVectors):
+        v4.unit(out=vec.Vector(0.0, 0.0))
+    for readonly in (vec.SparseVector(3, [0], [0.0]), vec.FrozenVector(0.0, 0.0, 0.0)):
+        with pytest.raises(TypeError):
+            v4.unit(out=readonly)
+        with pytest.raises(TypeError):
+            vec.cross(v4, v5, out=readonly)
+
+    # Projecting in place, through the scratch buffer, allocates nothing.
+    work = vec.Vector(numpy.ones(10000))
+    basis = vec.Vector(numpy.arange(10000.0))
+    work.project_orthogonal(basis, out=work)
+    tracemalloc.start()
+    for _ in range(10):
+        work.project_orthogonal(basis, out=work)
+        work.unit(out=work)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak < 10000
+
+
+def test_lazy():
+    v = vec.Vector(1.671, -1.012, -0.318)
+    w = vec.Vector(8.218, -9.341, 2)
+    u = vec.Vector(-1.129, 2.111, 4)
+    with lazy.enabled():
+        expr = 2 * v + 3.5 * w - u * 0.25 + v
+    assert isinstance(expr, lazy.LazyVector)
+    assert [c for (c, _) in expr.terms] == [3, 3.5, -0.25]
+    assert expr == 2 * v + 3.5 * w - u * 0.25 + v
+    assert expr.terms is None
+    assert fequal(vec.dot(lazy.defer(v) - w, u), vec.dot(v - w, u))
+    assert fequal((w - lazy.defer(v)).magnitude(), (w - v).magnitude())
+    assert type((lazy.defer(v) + w).evaluate()) is vec.Vector
+    assert isinstance(lazy.defer(v) * 2, lazy.LazyVector)
+    assert not isinstance(v * 2, lazy.LazyVector)
+    with pytest.raises(vec.NonConformantVectors):
+        lazy.defer(v) + vec.Vector(1, 2)
+
+    size = 1000000
+    a, b, c = (vec.Vector(numpy.full(size, x)) for x in (1.0, 2.0, 3.0))
+    tracemalloc.start()
+    eager = 2 * a + 3 * b - 4 * c
+    eager_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    tracemalloc.start()
+    with lazy.enabled():
+        fused = (2 * a + 3 * b - 4 * c).v
+    fused_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert (fused == eager.v).all()
+    assert fused_peak < 0.6 * eager_peak
+
+
+def test_engine():
+    rng = numpy.random.default_rng(3)
+    vs = [vec.Vector(row) for row in rng.standard_normal((50, 4))]
+    ws = [vec.Vector(row) for row in rng.standard_normal((50, 4))]
+
+    async def run():
+        async with engine.AsyncVectorEngine(max_batch=16, max_wait=0.01) as e:
+            angles = await asyncio.gather(*(e.angle(v, w) for (v, w) in zip(vs, ws)))
+            dots = await asyncio.gather(*(e.dot(v, w) for (v, w) in zip(vs, ws)))
+            mixed = await asyncio.gather(
+                e.project_orthogonal(vs[0], ws[0]),
+                e.angle(vs[1], ws[1], in_degrees=True),
+                e.angle(vs[2], vec.Vector(0, 0, 0, 0)),
+                e.dot(vs[3], vec.Vector(1, 2)),
+                return_exceptions=True)
+            return angles, dots, mixed, e.metrics()
+
+    angles, dots, mixed, metrics = asyncio.run(run())
+    for (v, w, a, d) in zip(vs, ws, angles, dots):
+        assert fequal(a, vec.angle(v, w))
+        assert fequal(d, vec.dot(v, w))
+    assert mixed[0] == vs[0].project_orthogonal(ws[0])
+    assert fequal(mixed[1], vec.angle(vs[1], ws[1], in_degrees=True))
+    assert isinstance(mixed[2], ValueError)
+    assert isinstance(mixed[3], vec.NonConformantVectors)
+    assert metrics['requests'] == 104
+    assert metrics['max_batch_size'] == 16
+    assert metrics['batches'] < 20
+    assert metrics['queue_depth'] == 0
+
+    # A request the engine cannot group fails alone and the engine carries on.
+    async def bad_then_good():
+        async with engine.AsyncVectorEngine() as e:
+            bad = await asyncio.gather(e.dot(vs[0], object()), return_exceptions=True)
+            good = await asyncio.wait_for(e.dot(vec.Vector(1, 2), vec.Vector(3, 4)), 1)
+            return bad[0], good
+
+    bad, good = asyncio.run(asyncio.wait_for(bad_then_good(), 5))
+    assert isinstance(bad, Exception)
+    assert good == 11
+
+    # A failing executor fails its requests, and close() still returns.
+    async def shut_down():
+        pool = concurrent.futures.ThreadPoolExecutor(1)
+        pool.shutdown()
+        async with engine.AsyncVectorEngine(executor=pool) as e:
+            return await asyncio.gather(e.dot(vs[0], ws[0]), e.angle(vs[1], ws[1]),
+                                        return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in asyncio.run(asyncio.wait_for(shut_down(), 5)))
+
+    # So does a dead collector, whose error later submissions raise.
+    async def broken():
+        await asyncio.sleep(0.01)
+        raise ZeroDivisionError
+
+    async def dead():
+        e = engine.AsyncVectorEngine()
+        e._serve = broken
+        queued = await asyncio.gather(e.dot(vs[0], ws[0]), e.dot(vs[1], ws[1]),
+                                      return_exceptions=True)
+        assert all(isinstance(r, ZeroDivisionError) for r in queued)
+        with pytest.raises(ZeroDivisionError):
+            await e.dot(vs[0], ws[0])
+        await e.close()
+
+    asyncio.run(asyncio.wait_for(dead(), 5))
+
+
+def test_instrument():
+    dot, unit = vec.dot, vec.Vector.unit
+    v = vec.Vector(3.039, 1.879, 0.5)
+    w = vec.Vector(0.825, 2.036, -1.2)
+    with instrument.profiled() as profile:
+        assert vec.dot is not dot
+        vec.angle(v, w)
+        v.unit()
+        vec.cross(v, w)
+        vec.dot(vec.Vector(1, 2), vec.Vector(3, 4))
+    assert vec.dot is dot and vec.Vector.unit is unit
+    assert profile['angle']['calls'] == 1
+    assert profile['dot']['calls'] >= 2
+    assert profile['dot']['dimensions'][2] == 1
+    assert profile['Vector.unit']['bytes'] >= 24
+    assert profile['cross']['time'] > 0
+    assert 'Vector.unit' in profile.report()
+
+    # Bytes include temporaries: the parallel projection as well as the result.
+    big = vec.Vector(numpy.ones(10000))
+    basis = vec.Vector(numpy.arange(10000.0))
+    with instrument.profiled() as profile:
+        big.project_orthogonal(basis)
+        vec.relate(big, basis)
+    assert profile['Vector.project_orthogonal']['bytes'] >= 2 * 80000
+    assert profile['Vector.project_parallel']['bytes'] >= 80000
+    assert profile['relate']['calls'] == 1
+
+    # Outside a profiled block nothing more is recorded.
+    before = instrument.snapshot()
+    vec.angle(v, w)
+    assert instrument.snapshot() == before
+    instrument.reset()
+    assert instrument.snapshot() == {}
+    assert not instrument.set_instrumentation(True)
+    vec.parallel(v, w)
+    assert instrument.set_instrumentation(False)
+    assert instrument.snapshot()['parallel']['calls'] == 1
+    instrument.reset()
+
+
+def test_mesh():
+    rng = numpy.random.default_rng(5)
+    v = rng.standard_normal((10, 3))
+    w = rng.standard_normal((10, 3))
+    crosses = mesh.cross(v, w, chunk_size=3)
+    areas = mesh.area_triangle(batch.VectorBatch(v), w, chunk_size=4)
+    assert fequal(mesh.area_parallelogram(v, w), 2 * areas)
+    assert fequal(batch.VectorBatch(v).area_triangle(batch.VectorBatch(w)), areas)
+    for i in range(10):
+        (a, b) = (vec.Vector(v[i]), vec.Vector(w[i]))
+        assert vec.Vector(crosses[i]) == vec.cross(a, b)
+        assert fequal(areas[i], vec.area_triangle(a, b))
+
+    vertices = rng.standard_normal((20, 3))
+    triangles = rng.integers(0, 20, (50, 3))
+    per_triangle = mesh.triangle_areas(vertices, triangles, chunk_size=7)
+    corners = vertices[triangles]
+    assert fequal(per_triangle, mesh.area_triangle(corners[:, 1] - corners[:, 0],
+                                                   corners[:, 2] - corners[:, 0]))
+    assert fequal(mesh.surface_area(vertices, triangles, chunk_size=7),
+                  per_triangle.sum())
+    with pytest.raises(vec.NonConformantVectors):
+        mesh.cross(numpy.ones((2, 2)), numpy.ones((2, 2)))
+    with pytest.raises(ValueError):
+        mesh.triangle_areas(vertices, [0, 1, 2])
+
+
+def test_dedupe(monkeypatch):
+    rng = numpy.random.default_rng(8)
+    base = rng.standard_normal((40, 5)) * 10.0 ** rng.integers(-6, 6, (40, 1))
+    base[:, 0] = 0
+    copies = base[rng.integers(0, 40, 120)] * (1 + rng.uniform(-9e-6, 9e-6, (120, 5)))
+    vectors = numpy.vstack([base, copies])
+    representatives, groups = group.dedupe(vectors)
+
+    # The same greedy grouping as comparing every pair with ==.
+    expected = []
+    for (i, row) in enumerate(vectors):
+        if not any(vec.Vector(row) == vec.Vector(vectors[r]) for r in expected):
+            expected.append(i)
+    assert representatives == expected == list(range(40))
+    assert sorted(i for g in groups for i in g) == list(range(160))
+    for g in groups:
+        assert all(vec.Vector(vectors[i]) == vec.Vector(vectors[g[0]]) for i in g)
+
+    d = group.ApproximateDict()
+    d[vec.Vector(1, 2)] = 'a'
+    d[vec.Vector(1.000001, 2)] = 'b'
+    d[vec.Vector(0, 1e-9)] = 'c'
+    assert len(d) == 2
+    assert d[vec.Vector(1, 2.00001)] == 'b'
+    assert d[vec.Vector(1e-9, 0)] == 'c'
+    assert d.get(vec.Vector(1, 2.1)) is None
+    assert isinstance(d.find(vec.Vector(1, 2)), vec.FrozenVector)
+    del d[vec.Vector(1, 2)]
+    assert vec.Vector(1, 2) not in d
+    with pytest.raises(vec.NonConformantVectors):
+        d[vec.Vector(1, 2, 3)] = 'd'
+
+    s = group.ApproximateSet(vec.Vector(row) for row in vectors)
+    assert len(s) == 40
+    assert s.add(vec.Vector(copies[0])) == vec.Vector(copies[0])
+    assert len(s) == 40
+    s.discard(vec.Vector(base[0]))
+    assert len(s) == 39 and vec.Vector(base[0]) not in s
+
+    # Embedding-sized vectors probe a bounded number of cells.
+    embeddings = rng.standard_normal((500, 768)) * 0.05
+    near = embeddings * (1 + rng.uniform(-1e-4, 1e-4, embeddings.shape))
+    representatives, groups = group.dedupe(numpy.vstack([embeddings, near]))
+    assert representatives == list(range(500))
+    assert all(g == [i, i + 500] for (i, g) in enumerate(groups))
+    d = group.ApproximateDict((vec.Vector(row), i) for (i, row) in enumerate(embeddings))
+    assert [d[vec.Vector(row)] for row in near] == list(range(500))
+    probes = list(group._equality_cells(group._scale(embeddings, 0.001), group._radius(0.001)))
+    assert max(len(p) for p in probes) <= 2 ** group.PROBE_AXES
+
+    # Sparse vectors with different supports land in different cells.
+    sparse = numpy.zeros((500, 2000))
+    for row in sparse:
+        row[rng.choice(2000, 5, replace=False)] = rng.uniform(0.5, 1, 5)
+    homes = collections.Counter(
+        p[0] for p in group._equality_cells(group._scale(sparse, 0.001), group._radius(0.001)))
+    assert max(homes.values()) == 1
+    d = group.ApproximateDict((vec.Vector(row), i) for (i, row) in enumerate(sparse))
+    assert [d[vec.Vector(row * (1 + 1e-5))] for row in sparse] == list(range(500))
+
+    # Vectors near too many cell boundaries are compared with every group.
+    monkeypatch.setattr(group, 'PROBE_AXES', 0)
+    assert group.dedupe(numpy.vstack([embeddings[:50], near[:50]]))[1] == \
+        [[i, i + 50] for i in range(50)]
+
+    # Large tolerances widen the probe radius to match.
+    y = numpy.expm1((256 + 0.02 - 128) * 0.1) * 1e-8 / 0.1
+    assert group.dedupe([[y], [0.9000001 * y]], tolerance=0.1) == ([0], [[0, 1]])
+    assert len(group.ApproximateSet([vec.Vector(y), vec.Vector(0.9000001 * y)], 0.1)) == 1
+    with pytest.raises(ValueError):
+        group.dedupe([[1, 2]], tolerance=1)
+
+
+def test_sparse():
+    rng = numpy.random.default_rng(11)
+    a = numpy.where(rng.random(40) < 0.3, rng.standard_normal(40), 0)
+    b = numpy.where(rng.random(40) < 0.6, rng.standard_normal(40), 0)
+    (da, db) = (vec.Vector(a), vec.Vector(b))
+    (sa, sb) = (vec.SparseVector.from_dense(a), vec.SparseVector.from_dense(b))
+    assert sa.nnz == numpy.count_nonzero(a) and len(sa) == 40
+    assert fequal(sa.magnitude(), da.magnitude())
+    assert sa.unit() == da.unit() and isinstance(sa.unit(), vec.SparseVector)
+    for (v, w) in [(sa, sb), (sa, db), (da, sb)]:
+        assert fequal(vec.dot(v, w), vec.dot(da, db))
+        assert fequal(vec.angle(v, w), vec.angle(da, db))
+        assert vec.parallel(v, w) == vec.parallel(da, db)
+        assert vec.orthogonal(v, w) == vec.orthogonal(da, db)
+        assert v.project_parallel(w) == da.project_parallel(db)
+        assert v.project_orthogonal(w) == da.project_orthogonal(db)
+        assert v + w == da + db and v - w == da - db and w - v == db - da
+    assert isinstance(sa - sb, vec.SparseVector)
+    assert isinstance(sa.project_parallel(sb), vec.SparseVector)
+    assert vec.parallel(sa, sa * -3.5) and vec.orthogonal(sa, vec.SparseVector(40))
+    assert sa[int(sa.indices[0])] == a[sa.indices[0]] and sa[-1] == a[-1]
+    with pytest.raises(vec.NonConformantVectors):
+        vec.dot(sa, vec.Vector(1, 2))
+    with pytest.raises(vec.NonConformantVectors):
+        sa + vec.SparseVector(41)
+    with pytest.raises(ValueError):
+        vec.SparseVector(40).unit()
+    with pytest.raises(ValueError):
+        vec.SparseVector(5, [1, 1], [2.0, 3.0])
+
+    # Nothing of the full dimension is allocated.
+    huge = vec.SparseVector(10 ** 9, [5, 10 ** 8, 10 ** 9 - 1], [1.0, 2.0, 3.0])
+    other = vec.SparseVector(10 ** 9, [10 ** 8, 7], [4.0, 1.0])
+    assert fequal(vec.dot(huge, other), 8.0)
+    assert fequal(vec.angle(huge, huge * 2), 0)
+    assert huge.project_orthogonal(other).nnz == 4
+
+
+def test_precision():
+    assert vec.Vector(1, 2, 3).v.dtype.kind == 'i'
+    assert vec.Vector([1, 2, 3], dtype=numpy.float32).v.dtype == numpy.float32
+    with vec.precision(dtype=numpy.float32):
+        assert vec.Vector(1, 2, 3).v.dtype == numpy.float32
+        assert (vec.Vector(1, 2) * 2).v.dtype == numpy.float32
+        assert vec.SparseVector(5, [1], [2]).values.dtype == numpy.float32
+        # Arrays and buffers keep their dtype, and views their memory.
+        v = vec.Vector([1, 2, 3], dtype=numpy.float64)
+        for w in (v * 2, v + v, v - v, v.unit()):
+            assert w.v.dtype == numpy.float64
+        data = numpy.arange(6.0)
+        view = vec.Vector.view(data, offset=2, count=3)
+        assert view.v.dtype == numpy.float64 and numpy.shares_memory(view.v, data)
+        buffer = array.array('d', [1, 2, 3])
+        shared = vec.Vector.from_buffer(buffer, offset=8)
+        shared.v[0] = 5
+        assert shared.v.dtype == numpy.float64 and buffer[1] == 5
+        assert vec.SparseVector(5, [1], numpy.array([2.0])).values.dtype == numpy.float64
+    assert vec.get_default_dtype() is None
+
+    # Cancelling terms: native float32 sums lose them, compensated does not.
+    a = numpy.array([1e8, 1.0, -1e8, 1.0] * 1000, dtype=numpy.float32)
+    v = vec.Vector(a)
+    ones = vec.Vector(numpy.ones(len(a), dtype=numpy.float32))
+    assert vec.dot(v, ones, accumulate=vec.COMPENSATED) == 2000
+    assert vec.dot(v, ones, accumulate=vec.PAIRWISE) == 2000
+    rng = numpy.random.default_rng(2)
+    x = rng.standard_normal(10000) * 10.0 ** rng.integers(-8, 8, 10000)
+    y = rng.standard_normal(10000)
+    exact = vec.dot(vec.Vector(x), vec.Vector(y), accumulate=vec.COMPENSATED)
+    reference = float(sum(fractions.Fraction(p) * fractions.Fraction(q)
+                          for (p, q) in zip(x.tolist(), y.tolist())))
+    assert exact == reference
+    with vec.precision(accumulate=vec.WIDE):
+        assert type(vec.dot(v, ones)) is numpy.float64
+        assert fequal(v.magnitude(), math.sqrt(2e16 * 1000 + 2000))
+    assert vec.get_accumulation() == vec.NATIVE
+    with pytest.raises(ValueError):
+        vec.set_accumulation('exact')
+
+
+def test_accumulate():
+    rng = numpy.random.default_rng(4)
+    rows = rng.standard_normal((3000, 4)) + 1e6
+    acc = accumulate.Accumulator(4)
+    for row in rows[:1000]:
+        acc.add(vec.Vector(row))
+    shard = accumulate.Accumulator(4)
+    shard.add_batch(batch.VectorBatch(rows[1000:2500]))
+    other = accumulate.Accumulator(4)
+    other += rows[2500:]
+    acc.merge(shard).merge(other).merge(accumulate.Accumulator(4))
+    assert acc.count == 3000
+    assert fequal(acc.mean().v, rows.mean(axis=0))
+    assert fequal(acc.variance().v, rows.var(axis=0))
+    assert fequal(acc.variance(ddof=1).v, rows.var(axis=0, ddof=1))
+    assert fequal(acc.sum().v, [math.fsum(c) for c in rows.T.tolist()])
+
+    # Adding a vector allocates nothing that grows with the stream.
+    v = vec.Vector(rows[0])
+    acc.add(v)
+    tracemalloc.start()
+    for _ in range(1000):
+        acc.add(v)
+    assert tracemalloc.get_traced_memory()[1] < 2000
+    tracemalloc.stop()
+
+    piped = stream.Pipeline(rows).accumulate()
+    assert fequal(piped.mean().v, rows.mean(axis=0))
+    with pytest.raises(vec.NonConformantVectors):
+        acc.add(vec.Vector(1, 2))
+    with pytest.raises(ValueError):
+        accumulate.Accumulator(4).mean()
+
+
+def test_wire():
+    v = vec.Vector(numpy.arange(1000.0))
+    message = wire.encode(v)
+    assert len(message) == wire.encoded_size(v) == 32 + 8000
+    decoded = wire.decode(message)
+    assert decoded == v and decoded.v.base is not None
+    assert not decoded.v.flags.writeable
+
+    b = batch.VectorBatch(numpy.arange(12, dtype=numpy.float32).reshape(4, 3))
+    s = vec.SparseVector(10 ** 6, [3, 77], [1.5, -2.0])
+    f = io.BytesIO()
+    for obj in (b, s, vec.Vector(1, 2, 3)):
+        wire.write(obj, f)
+    f.seek(0)
+    assert wire.read(f).v.tolist() == b.v.tolist()
+    assert wire.read(f) == s
+    assert wire.read(f).v.dtype.kind == 'i'
+    assert wire.read(f) is None
+
+    buffer = bytearray(100)
+    size = wire.encode_into(vec.Vector(4.0, 5.0), buffer, offset=8)
+    assert wire.decode(buffer, offset=8) == vec.Vector(4.0, 5.0) and size == 48
+    with pytest.raises(ValueError):
+        wire.decode(message[:-8])
+    with pytest.raises(ValueError):
+        wire.decode(b'x' * 40)
+
+    for obj in (v, vec.FrozenVector(1.0, 2.0), vec.Vec3(1, 2, 3), s,
+                lazy.defer(v) * 2):
+        for protocol in (2, 5):
+            copy = pickle.loads(pickle.dumps(obj, protocol=protocol))
+            assert copy == obj
+    buffers = []
+    data = pickle.dumps(v, protocol=5, buffer_callback=buffers.append)
+    assert len(data) < 100 and len(buffers) == 1
+    copy = pickle.loads(data, buffers=buffers)
+    assert copy == v and type(copy) is vec.Vector
+
+
+def test_relate():
+    pairs = [(vec.Vector(3.039, 1.879), vec.Vector(0.825, 2.036)),
+             (vec.Vector(-7.579, -7.88), vec.Vector(22.737, 23.64)),
+             (vec.Vector(-2.029, 9.97, 4.172), vec.Vector(-9.231, -6.639, -7.245)),
+             (vec.Vector(-2.328, -7.284, -1.214), vec.Vector(-1.821, 1.072, -2.94)),
+             (vec.Vector(0, 0, 0), vec.Vector(1, 2, 3)),
+             (vec.Vec3(1, 2, 3), vec.Vec3(-2, 1, 0)),
+             (vec.SparseVector(6, [1, 4], [2.0, 3.0]), vec.Vector(numpy.arange(6.0)))]
+    for (v, w) in pairs:
+        r = vec.relate(v, w)
+        assert fequal(r.dot, vec.dot(v, w))
+        assert fequal(r.v_magnitude, v.magnitude()) and fequal(r.w_magnitude, w.magnitude())
+        assert r.parallel == vec.parallel(v, w)
+        assert r.orthogonal == vec.orthogonal(v, w)
+        assert r.project_parallel == v.project_parallel(w)
+        assert r.project_orthogonal == v.project_orthogonal(w)
+        if v.is_zero():
+            with pytest.raises(ValueError):
+                r.angle
+        else:
+            assert fequal(r.angle, vec.angle(v, w))
+            assert fequal(r.degrees, vec.angle(v, w, in_degrees=True))
+    with pytest.raises(ValueError):
+        vec.relate(vec.Vector(1, 2), vec.Vector(0, 0)).coefficient
+    r = vec.relate(vec.Vector(1e-5, 0.0), vec.Vector(0.0, 1e-5))
+    assert fequal(r.angle, math.pi / 2) and not r.parallel
+    with pytest.raises(ValueError):
+        vec.relate(vec.Vector(1e-9, 0.0), vec.Vector(1e6, 1.0)).angle
+    with pytest.raises(vec.NonConformantVectors):
+        vec.relate(vec.Vector(1, 2), vec.Vector(1, 2, 3))
+
+
+def test_memo():
+    v = vec.Vector(numpy.arange(1.0, 101.0))
+    w = vec.Vector(numpy.arange(3.0, 103.0))
+    expected = (vec.angle(v, w), v.project_parallel(w), v.unit())
+    with memo.memoized(maxsize=8) as cache:
+        for _ in range(3):
+            assert vec.angle(v, w) == expected[0]
+            assert v.project_parallel(w) == expected[1]
+            assert vec.Vector(v.v.copy()).unit() == expected[2]
+        assert v.unit() is v.unit()
+        with pytest.raises(ValueError):
+            v.unit().v[0] = 1
+        assert vec.Vec2(3, 4).unit() is not vec.Vec2(3, 4).unit()
+        sparse = vec.SparseVector(6, [1, 4], [3.0, 4.0])
+        assert sparse.unit() is sparse.unit()
+        assert sparse.indices.flags.writeable
+        out = vec.Vector(numpy.empty(100))
+        assert v.unit(out=out) is out
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['size']) == (11, 5, 5)
+    assert vec.angle.__name__ == 'angle' and not hasattr(vec.angle, 'cache')
+    assert not hasattr(vec.Vector.unit, 'cache')
+
+    calls = []
+
+    @memo.memoize(maxsize=2)
+    def norm(v):
+        calls.append(v)
+        return v.magnitude()
+
+    vectors = [vec.Vector(i, 1) for i in range(3)]
+    for v in vectors + vectors[2:] + vectors[:1]:
+        norm(v)
+    assert len(calls) == 4
+    assert norm.cache.stats()['evictions'] == 2
+    assert norm(vec.Vector(2, 1)) == math.sqrt(5) and len(calls) == 4
+
+    sized = memo.Cache(maxbytes=2000)
+    big = memo.memoize(lambda v: v * 2, cache=sized)
+    for i in range(5):
+        big(vec.Vector(numpy.full(100, float(i))))
+    assert len(sized) == 2 and sized.stats()['bytes'] == 1600
+
+    shared = memo.memoize(vec.angle)
+    vectors = [vec.Vector(numpy.random.rand(50)) for _ in range(10)]
+    errors = []
+
+    def work():
+        for _ in range(20):
+            for (v, w) in zip(vectors, vectors[1:]):
+                if shared(v, w) != vec.angle(v, w):
+                    errors.append((v, w))
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert shared.cache.stats()['hits'] + shared.cache.stats()['misses'] == 8 * 20 * 9
+    assert len(shared.cache) == 9
+    with pytest.raises(ValueError):
+        with memo.memoized(['magnitude']):
+            pass
+
+    # Cached relations keep their own copies of the operands.
+    with memo.memoized(names=('relate',)) as cache:
+        v = vec.Vector(numpy.array([3.0, 4.0]))
+        vec.relate(v, vec.Vector(numpy.array([2.0, 0.0])))
+        v.v[0] = 100.0
+        r = vec.relate(vec.Vector(numpy.array([3.0, 4.0])), vec.Vector(numpy.array([2.0, 0.0])))
+        assert r.project_orthogonal == vec.Vector(0.0, 4.0)
+        assert (cache.hits, cache.stats()['bytes']) == (1, 2 * 16 + 24)
+
+    # Instrumentation switched on inside the block and off after it.
+    original = vec.angle
+    with memo.memoized():
+        instrument.set_instrumentation(True)
+    assert not hasattr(vec.angle, 'cache')
+    instrument.set_instrumentation(False)
+    assert vec.angle is original and not hasattr(vec.Vector.unit, 'cache')
+    # And the other way around.
+    instrument.set_instrumentation(True)
+    with memo.memoized() as cache:
+        instrument.set_instrumentation(False)
+        for _ in range(2):
+            vec.angle(vec.Vector(1, 2), vec.Vector(3, 4))
+    assert cache.hits == 1 and vec.angle is original